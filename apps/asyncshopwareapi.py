@@ -0,0 +1,219 @@
+from collections import deque
+from datetime import datetime, timezone
+import asyncio
+import logging
+import time
+import httpx
+from apps.cassette import AsyncCassetteTransport
+from apps.shopwareapi import ShopWareAPI, inventory_id
+from utils.metrics import count_lookups, observe_request
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncShopWareAPI(ShopWareAPI):
+    """
+    asyncio flavour of ShopWareAPI backed by a pooled httpx.AsyncClient.
+
+    Every endpoint method has the same name and arguments as in ShopWareAPI but
+    returns an awaitable, so independent fetches can run concurrently on the
+    event loop. is_tyre stays synchronous: it only reads what prime_tyre_index
+    classified, so every part must be primed before the report math runs.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Everything prime_tyre_index classified for this client. The tire
+        # index's fallback cache is an LRU, so a run priming more new items
+        # than it holds would lose the first ones before is_tyre reads them.
+        self._primed_tyres = {}
+
+    def _create_session(self):
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        )
+        if self.cassette_mode:
+            transport = AsyncCassetteTransport(self.cassette, self.cassette_mode, transport)
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(self.timeout),
+            headers={'Accept-Encoding': 'gzip, deflate'}
+        )
+
+    async def close(self):
+        await self.session.aclose()
+        if self.cassette_mode == 'record':
+            await asyncio.to_thread(self.cassette.save)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def get_headers(self):
+        # httpx rejects None header values where requests silently drops them
+        return {key: value for key, value in super().get_headers().items() if value is not None}
+
+    async def _get(self, path, params=None):
+        url = f"{self.base_url}/api/v1/tenants/{self.tenant_id}/{path}"
+        page = params.get('page') if params else None
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                response = await self.session.get(url, headers=self.get_headers(), params=params)
+            except httpx.TransportError as e:
+                observe_request(path, 'error', time.perf_counter() - started, page=page)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"GET {path} failed ({e}), retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            else:
+                observe_request(path, response.status_code, time.perf_counter() - started, len(response.content), page)
+                self._record_rate_limit(response.status_code, response.headers.get('Retry-After'))
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                delay = self._backoff_delay(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"GET {path} returned {response.status_code}, retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_all_pages(self, fetch, *args, **kwargs):
+        """
+        Async counterpart of ShopWareAPI.get_all_pages: page 1 first, then pages
+        2..N concurrently, at most page_workers in flight at once.
+        """
+        first_page = await fetch(*args, page=1, **kwargs)
+        total_pages = first_page.get('total_pages', 1) or 1
+        pages = [first_page]
+        if total_pages > 1:
+            semaphore = asyncio.Semaphore(self.page_workers)
+
+            async def fetch_page(page):
+                async with semaphore:
+                    return await fetch(*args, page=page, **kwargs)
+
+            pages.extend(await asyncio.gather(*(fetch_page(page) for page in range(2, total_pages + 1))))
+
+        results = [result for response in pages for result in response.get('results', [])]
+        return {
+            "results": results,
+            "limit": len(results),
+            "limited": False,
+            "total_count": first_page.get('total_count', len(results)),
+            "current_page": 1,
+            "total_pages": total_pages
+        }
+
+    async def iter_pages(self, fetch, *args, prefetch=None, **kwargs):
+        """
+        Async counterpart of ShopWareAPI.iter_pages, for use with `async for`.
+        """
+        prefetch = max(1, self.page_prefetch if prefetch is None else prefetch)
+        first_page = await fetch(*args, page=1, **kwargs)
+        total_pages = first_page.get('total_pages', 1) or 1
+        yield first_page.get('results', [])
+        pending = deque()
+        next_page = 2
+        try:
+            while next_page <= total_pages or pending:
+                while next_page <= total_pages and len(pending) < prefetch:
+                    pending.append(asyncio.ensure_future(fetch(*args, page=next_page, **kwargs)))
+                    next_page += 1
+                yield (await pending.popleft()).get('results', [])
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _ensure_tire_index(self):
+        if self._tire_index_ready:
+            return
+        try:
+            started_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            response = await self.get_all_pages(self.get_inventories, per_page=100, **self.tire_index.refresh_filters())
+            self.tire_index.update(response['results'], started_at)
+        except Exception as e:
+            logger.error(f"Could not refresh tire index, falling back to per-item lookups: {e}")
+        self._tire_index_ready = True
+
+    async def prime_tyre_index(self, inventory_item_ids):
+        """
+        Refresh the tire index and concurrently classify any IDs it does not
+        know yet, so later is_tyre calls are pure in-memory lookups.
+        """
+        await self._ensure_tire_index()
+        item_ids = {inventory_id(item_id) for item_id in inventory_item_ids if item_id is not None}
+        unknown_ids = set()
+        for item_id in item_ids:
+            is_tire = self.tire_index.lookup(item_id)
+            if is_tire is None:
+                unknown_ids.add(item_id)
+            else:
+                self._primed_tyres[item_id] = is_tire
+        count_lookups('inventory', hits=len(item_ids) - len(unknown_ids), misses=len(unknown_ids))
+        semaphore = asyncio.Semaphore(self.page_workers)
+
+        async def classify(item_id):
+            async with semaphore:
+                try:
+                    inventory_item = await self.get_inventory(item_id)
+                except Exception as e:
+                    logger.error(f"Error fetching inventory item {item_id}: {e}")
+                    # Same as ShopWareAPI.is_tyre when the lookup fails
+                    self._primed_tyres[item_id] = False
+                    return
+                is_tire = self.tire_index.classify(inventory_item)
+                self.tire_index.remember(item_id, is_tire)
+                self._primed_tyres[item_id] = is_tire
+
+        await asyncio.gather(*(classify(item_id) for item_id in unknown_ids))
+
+    async def _ensure_staff_directory(self):
+        if self._staff_directory_ready:
+            return
+        if self.staff_directory.is_stale():
+            try:
+                loaded_at = time.time()
+                response = await self.get_all_pages(self.get_staffs, per_page=100)
+                self.staff_directory.update(response['results'], loaded_at)
+            except Exception as e:
+                logger.error(f"Could not refresh staff directory, falling back to per-member lookups: {e}")
+        self._staff_directory_ready = True
+
+    async def get_staff_names(self, staff_ids):
+        """
+        Async counterpart of ShopWareAPI.get_staff_names.
+        """
+        staff_ids = {staff_id for staff_id in staff_ids if staff_id}
+        await self._ensure_staff_directory()
+        unknown_ids = [staff_id for staff_id in staff_ids if self.staff_directory.lookup(staff_id) is None]
+        count_lookups('staff', hits=len(staff_ids) - len(unknown_ids), misses=len(unknown_ids))
+        if unknown_ids:
+            semaphore = asyncio.Semaphore(self.page_workers)
+
+            async def fetch(staff_id):
+                async with semaphore:
+                    try:
+                        self.staff_directory.add(await self.get_staff_member(staff_id))
+                    except Exception as e:
+                        logger.error(f"Error fetching technician name for ID {staff_id}: {str(e)}")
+
+            await asyncio.gather(*(fetch(staff_id) for staff_id in unknown_ids))
+            await asyncio.to_thread(self.staff_directory.save)
+        return self.staff_directory.resolve(staff_ids)
+
+    def is_tyre(self, inventory_item_id):
+        if inventory_item_id is None:
+            return False
+        inventory_item_id = inventory_id(inventory_item_id)
+        is_tire = self._primed_tyres.get(inventory_item_id)
+        if is_tire is None:
+            is_tire = self.tire_index.lookup(inventory_item_id)
+        if is_tire is None:
+            # Guessing False here would silently count a tire as a part
+            raise LookupError(f"Inventory item {inventory_item_id} was not primed with prime_tyre_index")
+        return is_tire
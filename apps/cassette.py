@@ -0,0 +1,199 @@
+from datetime import date, datetime
+from urllib.parse import parse_qsl, urlsplit
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+
+
+logger = logging.getLogger(__name__)
+
+
+# Query values that move with the run date (closed_after, updated_after, ...)
+DATE_VALUE = re.compile(r'^(\d{4}-\d{2}-\d{2})')
+
+
+def request_key(url):
+    """
+    Cassette key for a request: the path below the tenant plus sorted query params.
+    """
+    parts = urlsplit(url)
+    path = re.sub(r'^.*/api/v1/tenants/[^/]+/', '', parts.path)
+    params = sorted(parse_qsl(parts.query))
+    return path + ('?' + '&'.join(f"{key}={value}" for key, value in params) if params else '')
+
+
+def relaxed_key(key, run_date):
+    """
+    The request with each date param replaced by its offset in days from
+    run_date, so the same request made on another day gets the same key
+    while a 1-day and an 8-week window stay apart.
+    """
+    def relative(value):
+        match = DATE_VALUE.match(value)
+        if not match:
+            return value
+        return f"@{(datetime.strptime(match.group(1), '%Y-%m-%d').date() - run_date).days}d"
+
+    path, _, query = key.partition('?')
+    params = [param.split('=', 1) for param in query.split('&')] if query else []
+    return path + ('?' + '&'.join(f"{name}={relative(value)}" for name, value in params) if params else '')
+
+
+class Cassette:
+    """
+    ShopWare responses recorded to a gzipped JSON file, keyed by request.
+
+    Replays match the exact request first and then the same request with
+    its date parameters shifted by the days between recording and replay,
+    so a cassette recorded on one day still serves runs made on later days.
+    If several requests recorded on the same day shift to one key (date
+    params that differ only in the time of day), that key is ambiguous and
+    is not replayed rather than guessed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SHOPWARE_CASSETTE_PATH', 'data/shopware_cassette.json.gz')
+        self.interactions = {}
+        self._relaxed = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                self.interactions = json.load(f)
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            logger.error(f"Could not load cassette from {self.path}: {e}")
+            return
+        for key, interaction in self.interactions.items():
+            self._remember_relaxed(key, interaction)
+        logger.info(f"Loaded cassette with {len(self.interactions)} recorded requests")
+
+    def save(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with self._lock, gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(self.interactions, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            logger.info(f"Saved cassette with {len(self.interactions)} recorded requests to {self.path}")
+        except OSError as e:
+            logger.error(f"Could not save cassette to {self.path}: {e}")
+
+    def _remember_relaxed(self, key, interaction):
+        # Interactions recorded without their date can only be replayed exactly
+        if 'recorded_on' not in interaction:
+            return
+        recorded_on = date.fromisoformat(interaction['recorded_on'])
+        relaxed = relaxed_key(key, recorded_on)
+        previous = self._relaxed.get(relaxed)
+        if previous is None or previous[1] < recorded_on:
+            self._relaxed[relaxed] = (key, recorded_on)
+        elif previous[1] == recorded_on and previous[0] not in (key, None):
+            self._relaxed[relaxed] = (None, recorded_on)
+
+    def record(self, url, status, body):
+        key = request_key(url)
+        interaction = {'status': status, 'body': body, 'recorded_on': date.today().isoformat()}
+        with self._lock:
+            self.interactions[key] = interaction
+            self._remember_relaxed(key, interaction)
+
+    def lookup(self, url):
+        """
+        Return the recorded {'status', 'body'} for a request, or None.
+        """
+        key = request_key(url)
+        interaction = self.interactions.get(key)
+        if interaction is None:
+            relaxed = self._relaxed.get(relaxed_key(key, date.today()))
+            if relaxed is not None and relaxed[0] is None:
+                logger.warning(f"Several recorded requests match {key} on another day, not replaying any")
+            elif relaxed is not None:
+                interaction = self.interactions[relaxed[0]]
+        return interaction
+
+
+def _decode(content):
+    try:
+        return json.loads(content) if content else None
+    except ValueError:
+        return content.decode('utf-8', errors='replace')
+
+
+def _encode(body):
+    return (body if isinstance(body, str) else json.dumps(body)).encode('utf-8')
+
+
+class CassetteAdapter(BaseAdapter):
+    """
+    requests transport adapter that records through to a real adapter or
+    replays from a cassette without touching the network.
+    """
+
+    def __init__(self, cassette, mode, adapter=None):
+        super().__init__()
+        self.cassette = cassette
+        self.mode = mode
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        if self.mode == 'record':
+            response = self.adapter.send(request, **kwargs)
+            self.cassette.record(request.url, response.status_code, _decode(response.content))
+            return response
+        interaction = self.cassette.lookup(request.url)
+        response = requests.Response()
+        if interaction is None:
+            logger.warning(f"No recorded response for {request_key(request.url)}")
+            interaction = {'status': 404, 'body': {}}
+        response.status_code = interaction['status']
+        response._content = _encode(interaction['body'])
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        if self.adapter is not None:
+            self.adapter.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """
+    httpx counterpart of CassetteAdapter for AsyncShopWareAPI.
+    """
+
+    def __init__(self, cassette, mode, transport=None):
+        self.cassette = cassette
+        self.mode = mode
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        url = str(request.url)
+        if self.mode == 'record':
+            response = await self.transport.handle_async_request(request)
+            content = await response.aread()
+            self.cassette.record(url, response.status_code, _decode(content))
+            # aread() has already undone any gzip, so drop the headers describing it
+            headers = [(name, value) for name, value in response.headers.items() if name.lower() not in ('content-encoding', 'content-length')]
+            return httpx.Response(response.status_code, headers=headers, content=content)
+        interaction = self.cassette.lookup(url)
+        if interaction is None:
+            logger.warning(f"No recorded response for {request_key(url)}")
+            interaction = {'status': 404, 'body': {}}
+        return httpx.Response(interaction['status'], headers={'Content-Type': 'application/json'}, content=_encode(interaction['body']))
+
+    async def aclose(self):
+        if self.transport is not None:
+            await self.transport.aclose()
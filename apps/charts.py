@@ -0,0 +1,251 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import matplotlib
+from matplotlib.artist import setp
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import seaborn as sns
+from apps.rendercache import content_key, get_shared_render_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+# Image subtype (image/<subtype>) each chart format produces
+CHART_IMAGE_TYPES = {'png': 'png', 'svg': 'svg+xml', 'panel': 'png'}
+
+# Bump when a drawing change should invalidate cached charts; library upgrades already do
+CHART_STYLE_VERSION = 2
+
+_style_ready = False
+
+
+def setup_style():
+    """
+    Apply the report chart style once per process rather than before every chart.
+    """
+    global _style_ready
+    if not _style_ready:
+        sns.set_theme(style="whitegrid")
+        _style_ready = True
+
+
+def draw_plot(ax, data, x_column, y_column, title, x_label, y_label, plot_type='bar', scale=1.0):
+    """
+    Draw one report chart onto `ax`.
+
+    :param ax: Axes to draw on
+    :param data: DataFrame containing the data to plot
+    :param x_column: Name of the column to use for x-axis
+    :param y_column: Name of the column to use for y-axis
+    :param title: Title of the plot
+    :param x_label: Label for x-axis
+    :param y_label: Label for y-axis
+    :param plot_type: Type of plot ('bar' or 'line')
+    :param scale: Factor applied to every font size
+    """
+    # Plot based on the specified type
+    if plot_type == 'bar':
+        sns.barplot(x=data[x_column], y=data[y_column], palette='coolwarm', ax=ax)
+    elif plot_type == 'line':
+        sns.lineplot(x=data[x_column], y=data[y_column], marker='o', color='b', ax=ax)
+    else:
+        raise ValueError("Unsupported plot type. Use 'bar' or 'line'.")
+
+    # Enhance plot aesthetics
+    ax.set_title(title, fontsize=16 * scale, fontweight='bold')
+    ax.set_xlabel(x_label, fontsize=14 * scale)
+    ax.set_ylabel(y_label, fontsize=14 * scale)
+    setp(ax.get_xticklabels(), rotation=45, ha='right')
+    ax.tick_params(axis='y', labelsize=12 * scale)
+    ax.grid(True, linestyle='--', alpha=0.6)
+
+
+def encoded_size(content):
+    # Bytes `content` takes once base64 encoded, as in a data URI or a MIME part
+    return -(-len(content) // 3) * 4
+
+
+def save_figure(fig, fmt='png', dpi=100, min_dpi=50, budget=None):
+    """
+    Save a figure and return the image bytes.
+
+    PNGs whose base64 form is over `budget` bytes have their resolution scaled
+    down by the square root of the overshoot, since PNG size grows with pixel
+    area, and are saved again, never below `min_dpi`. SVGs have no resolution
+    to trade and are only checked against the budget.
+    """
+    if fmt == 'svg':
+        buffer = io.BytesIO()
+        # Keep text as <text> elements rather than glyph outlines
+        with matplotlib.rc_context({'svg.fonttype': 'none'}):
+            fig.savefig(buffer, format='svg')
+        content = buffer.getvalue()
+        if budget and encoded_size(content) > budget:
+            logger.warning(f"SVG chart is {encoded_size(content)} bytes, over its {budget} byte budget")
+        return content
+
+    for _ in range(3):
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=dpi)
+        content = buffer.getvalue()
+        if not budget or encoded_size(content) <= budget or dpi <= min_dpi:
+            break
+        dpi = max(min_dpi, int(dpi * (budget / encoded_size(content)) ** 0.5 * 0.95))
+    if budget and encoded_size(content) > budget:
+        logger.warning(f"Chart is {encoded_size(content)} bytes at {dpi} dpi, over its {budget} byte budget")
+    return content
+
+
+def _new_figure(figsize):
+    # A Figure with its own Agg canvas keeps no pyplot state, so charts can render side by side
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_chart(spec, fmt='png', dpi=100, min_dpi=50, budget=None, figsize=(12, 6)):
+    """
+    Render one chart and return the image bytes.
+
+    :param spec: draw_plot keyword arguments
+    :param figsize: Size of the figure as a tuple (width, height)
+    """
+    setup_style()
+    fig = _new_figure(figsize)
+    draw_plot(fig.subplots(), **spec)
+    # Optimize layout
+    fig.tight_layout()
+    return save_figure(fig, fmt, dpi, min_dpi, budget)
+
+
+def render_panel(specs, fmt='png', dpi=100, min_dpi=50, budget=None, columns=2, panel_size=(8, 5)):
+    """
+    Render several charts as panels of one figure and return the image bytes.
+
+    :param specs: List of draw_plot keyword arguments, one per panel
+    :param columns: Panels per row
+    :param panel_size: Size of each panel as a tuple (width, height)
+    """
+    setup_style()
+    rows = -(-len(specs) // columns)
+    fig = _new_figure((panel_size[0] * columns, panel_size[1] * rows))
+    axes = fig.subplots(rows, columns, squeeze=False)
+    for ax, spec in zip(axes.flat, specs):
+        draw_plot(ax, **spec, scale=0.8)
+    for ax in list(axes.flat)[len(specs):]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    return save_figure(fig, 'png' if fmt == 'panel' else fmt, dpi, min_dpi, budget)
+
+
+def _trim(spec):
+    # Workers only need the two plotted columns of each DataFrame
+    return {**spec, 'data': spec['data'][[spec['x_column'], spec['y_column']]]}
+
+
+def _cache_key(kind, *args):
+    # The library versions are part of the key because they change the pixels
+    return content_key(kind, CHART_STYLE_VERSION, matplotlib.__version__, sns.__version__, *args)
+
+
+class ChartRenderer:
+    """
+    Renders report charts in a pool of worker processes.
+
+    Matplotlib drawing is CPU-bound and holds the GIL, so the charts of a
+    report render in separate processes, each one a single Figure with its own
+    Agg canvas. Workers fork from a forkserver that has already imported
+    matplotlib and seaborn and applied the style, so they start quickly and
+    never import the application. With one worker, or if the pool breaks,
+    charts render in this process instead.
+
+    Rendered charts are kept in a RenderCache keyed by their data and
+    parameters, so re-running a report over unchanged data skips matplotlib.
+    """
+
+    def __init__(self, workers=None, start_method=None, cache=None):
+        self.workers = workers or int(os.getenv('CHART_WORKERS', min(6, os.cpu_count() or 1)))
+        self.start_method = start_method or os.getenv('CHART_START_METHOD', 'forkserver')
+        self.cache = cache or get_shared_render_cache()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context(self.start_method)
+                if self.start_method == 'forkserver':
+                    context.set_forkserver_preload(['apps.charts'])
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=setup_style)
+            return self._pool
+
+    def _run(self, jobs):
+        """
+        Run (function, args, kwargs) jobs, in the pool when there is one, and return their results in order.
+        """
+        if self.workers > 1 and len(jobs) > 1:
+            try:
+                pool = self._get_pool()
+                futures = [pool.submit(function, *args, **kwargs) for function, args, kwargs in jobs]
+                return [future.result() for future in futures]
+            except (BrokenProcessPool, OSError) as e:
+                logger.error(f"Chart worker pool failed, rendering in process: {str(e)}")
+                self.close()
+        return [function(*args, **kwargs) for function, args, kwargs in jobs]
+
+    def render_charts(self, specs, fmt='png', dpi=100, min_dpi=50, budget=None):
+        """
+        Render a chart per spec concurrently.
+
+        :param specs: Dict of chart name to draw_plot keyword arguments
+        :param budget: Encoded bytes all charts together may take, split evenly
+        :return: Dict of chart name to image bytes
+        """
+        per_chart = budget // len(specs) if budget else None
+        plots, keys, jobs = {}, {}, []
+        for name, spec in specs.items():
+            args = (_trim(spec), fmt, dpi, min_dpi, per_chart)
+            keys[name] = _cache_key('chart', *args)
+            plots[name] = self.cache.get(keys[name])
+            if plots[name] is None:
+                jobs.append((name, (render_chart, args, {})))
+        if jobs:
+            for (name, _), plot in zip(jobs, self._run([job for _, job in jobs])):
+                plots[name] = plot
+                self.cache.put(keys[name], plot)
+        return plots
+
+    def render_panel(self, specs, fmt='png', dpi=100, min_dpi=50, budget=None):
+        """
+        Render all specs as one multi-panel figure.
+        """
+        specs = [_trim(spec) for spec in specs]
+        key = _cache_key('panel', specs, fmt, dpi, min_dpi, budget)
+        return self.cache.get_or_render(key, lambda: render_panel(specs, fmt, dpi, min_dpi, budget))
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+_shared_renderer = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_chart_renderer():
+    """
+    The process-wide renderer WeeklyReports uses unless given its own.
+    """
+    global _shared_renderer
+    with _shared_lock:
+        if _shared_renderer is None:
+            _shared_renderer = ChartRenderer()
+        return _shared_renderer
@@ -1,6 +1,10 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta, timezone
 import pandas as pd
+import asyncio
 import logging
+from apps.financials import compute_ro_financials, summarize_closed_sales
+from apps.records import parse_repair_orders
+from utils.metrics import SectionTimer
 
 logging.basicConfig(
     level=logging.INFO,
@@ -14,10 +18,84 @@ logger = logging.getLogger(__name__)
 
 
 class DailyReports:
-    def __init__(self, api):
+    def __init__(self, api, store=None, rollup=None, store_synced=False):
+        """
+        :param store_synced: The caller synced the store just before, so the run reads it without syncing again
+        """
         self.api = api
+        self.store = store
+        self.rollup = rollup
+        self.store_synced = store_synced
+        self._repair_orders = {}
+        # False once the store sync or the repair-order fetch fails, so a partial day is never rolled up
+        self._snapshot_complete = True
+        self.timer = SectionTimer('daily')
+
+    def get_repair_orders_snapshot(self, days=1):
+        """
+        Repair orders closed since `days` ago, fetched once per report run.
+
+        Every section reads this same snapshot and applies its own status
+        filter locally, so the sections agree with each other.
+        """
+        if days not in self._repair_orders:
+            start_date = datetime.now().date() - timedelta(days=days)
+            if self.store is not None:
+                repair_orders = self.store.get_repair_orders_closed_after(start_date)
+            else:
+                repair_orders = self.api.get_all_pages(
+                    self.api.get_repair_orders,
+                    per_page=100,
+                    closed_after=f"{start_date}T00:00:00Z",
+                )['results']
+            # Keep only the fields the report reads
+            self._repair_orders[days] = parse_repair_orders(repair_orders)
+        return self._repair_orders[days]
+
+    def _get_appointments(self, updated_after):
+        if self.store is not None:
+            return {'results': self.store.get_appointments_updated_after(updated_after)}
+        return self.api.get_all_pages(self.api.get_appointments, updated_after)
+
+    def _get_payments(self, updated_after):
+        if self.store is not None:
+            return {'results': self.store.get_payments_updated_after(updated_after)}
+        return self.api.get_all_pages(self.api.get_payments_of_day, updated_after)
+
+    def sync_store(self):
+        """
+        Bring the local store up to date before reading from it. On failure the
+        report is built from the data as of the last successful sync.
+        """
+        if self.store is None or self.store_synced:
+            return
+        try:
+            self.store.sync(self.api)
+        except Exception as e:
+            self._snapshot_complete = False
+            logger.error(f"Error syncing local store, using data from the last sync: {str(e)}")
+
+    def record_daily_kpis(self):
+        """
+        Persist the KPI rollup rows for the business days the snapshot fully
+        covers (normally yesterday) so the weekly trends can read them.
+        """
+        if self.rollup is None:
+            return
+        if not self._snapshot_complete:
+            logger.error("Not recording daily KPIs: the repair orders could not be fetched in full")
+            return
+        try:
+            start = datetime.combine(datetime.now().date() - timedelta(days=1), time(), tzinfo=timezone.utc)
+            self.rollup.record(self.get_repair_orders_snapshot(), self.api.is_tyre, start)
+        except Exception as e:
+            logger.error(f"Error recording daily KPIs: {str(e)}")
+
+    @staticmethod
+    def _filter_status(repair_orders, status):
+        return [ro for ro in repair_orders if ro.get('status') == status]
 
-    def get_next_7_weekdays_appointments(self):
+    def get_next_7_weekdays_appointments(self, appointments=None):
         try:
             today = datetime.now().date()
             end_date = today + timedelta(days=13)  # Look ahead 13 days to ensure we get 7 weekdays
@@ -26,21 +104,16 @@ class DailyReports:
             updated_after = today - timedelta(days=30)
 
             appointment_counts = {}
-            page = 1
-            while True:
-                appointments = self.api.get_appointments(updated_after, page=page)
+            if appointments is None:
+                appointments = self._get_appointments(updated_after)
 
-                for appointment in appointments['results']:
-                    start_at = datetime.fromisoformat(appointment['start_at'].rstrip('Z')).date()
+            for appointment in appointments['results']:
+                start_at = datetime.fromisoformat(appointment['start_at'].rstrip('Z')).date()
 
-                    # Check if the appointment is within our date range and on a weekday
-                    if today <= start_at <= end_date and start_at.weekday() < 5:
-                        appointment_counts[start_at] = appointment_counts.get(start_at, 0) + 1
+                # Check if the appointment is within our date range and on a weekday
+                if today <= start_at <= end_date and start_at.weekday() < 5:
+                    appointment_counts[start_at] = appointment_counts.get(start_at, 0) + 1
 
-                # Check if we've processed all pages
-                if page >= appointments['total_pages']:
-                    break
-                page += 1
             logger.info(f"Got next 7 weekdays appointments")
             return self._create_dataframe(today, appointment_counts)
         except Exception as e:
@@ -74,10 +147,11 @@ class DailyReports:
             logger.error(f"Error getting categories: {str(e)}")
             return pd.DataFrame()  # Return an empty DataFrame on error
 
-    def get_payments(self):
+    def get_payments(self, payments_data=None):
         try:
             updated_after = datetime.now().date() - timedelta(days=1)
-            payments_data = self.api.get_payments_of_day(updated_after)
+            if payments_data is None:
+                payments_data = self._get_payments(updated_after)
             payments = [{
                 'Payment ID': payment['id'],
                 'Repair Order ID': payment['repair_order_id'],
@@ -93,25 +167,13 @@ class DailyReports:
             logger.error(f"Error getting payments: {str(e)}")
             return pd.DataFrame()  # Return an empty DataFrame on error
 
-    def get_tech_billable_hours(self, days=1):
+    def get_tech_billable_hours(self, days=1, repair_orders=None, tech_names=None):
         try:
             today = datetime.now().date()
             start_date = today - timedelta(days=days)
 
-            repair_orders = []
-            page = 1
-            while True:
-                response = self.api.get_repair_orders(
-                    page=page,
-                    per_page=100,
-                    closed_after=start_date.isoformat(),
-                )
-
-                repair_orders.extend(response['results'])
-
-                if page >= response['total_pages']:
-                    break
-                page += 1
+            if repair_orders is None:
+                repair_orders = self.get_repair_orders_snapshot(days)
 
             tech_hours = {}
             for ro in repair_orders:
@@ -124,14 +186,10 @@ class DailyReports:
                                 if tech_id not in tech_hours:
                                     tech_hours[tech_id] = 0
                                 tech_hours[tech_id] += hours
-            tech_names = {}
-            for tech_id in tech_hours.keys():
-                try:
-                    staff_member = self.api.get_staff_member(tech_id)
-                    tech_names[tech_id] = f"{staff_member['first_name']} {staff_member['last_name']}"
-                except Exception as e:
-                    logger.error(f"Error fetching technician name for ID {tech_id}: {str(e)}")
-                    tech_names[tech_id] = f"Unknown (ID: {tech_id})"
+            tech_names = dict(tech_names or {})
+            unnamed_ids = [tech_id for tech_id in tech_hours.keys() if tech_id not in tech_names]
+            if unnamed_ids:
+                tech_names.update(self.api.get_staff_names(unnamed_ids))
 
             df = pd.DataFrame([(tech_names[tech_id], hours) for tech_id, hours in tech_hours.items()],
                               columns=['Technician Name', 'Billable Hours'])
@@ -143,71 +201,51 @@ class DailyReports:
             return pd.DataFrame(), ""  # Return empty DataFrame and empty date on error
 
 
-    def get_low_margin_services(self, days=1, margin_threshold=0.4):
+    def get_low_margin_services(self, days=1, margin_threshold=0.4, repair_orders=None):
         try:
             today = datetime.now().date()
             start_date = today - timedelta(days=days)
 
             low_margin_services = []
-            page = 1
-            while True:
-                response = self.api.get_repair_orders(
-                    page=page,
-                    per_page=100,
-                    closed_after=start_date.isoformat()
-                )
+            if repair_orders is None:
+                repair_orders = self.get_repair_orders_snapshot(days)
+
+            for ro in repair_orders:
+                for service in ro.get('services', []):
+                    service_low_margin_parts = []
+                    for part in service.get('parts', []):
+                        if not self.api.is_tyre(part['part_inventory_id']):  # Check for tire
+                            cost = part['cost_cents'] / 100
+                            price = part['quoted_price_cents'] / 100
+                            if cost > 0:
+                                margin = (price - cost) / price
+                                if margin < margin_threshold:
+                                    service_low_margin_parts.append({
+                                        'part_number': part['number'],
+                                        'description': part['description'],
+                                        'cost': cost,
+                                        'price': price,
+                                        'margin': margin
+                                    })
+
+                    if service_low_margin_parts:
+                        low_margin_services.append({
+                            'ro_number': ro['number'],
+                            'service_title': service['title'],
+                            'low_margin_parts': service_low_margin_parts
+                        })
 
-                for ro in response['results']:
-                    for service in ro.get('services', []):
-                        service_low_margin_parts = []
-                        for part in service.get('parts', []):
-                            if not self.api.is_tyre(part['part_inventory_id']):  # Check for tire
-                                cost = part['cost_cents'] / 100
-                                price = part['quoted_price_cents'] / 100
-                                if cost > 0:
-                                    margin = (price - cost) / price
-                                    if margin < margin_threshold:
-                                        service_low_margin_parts.append({
-                                            'part_number': part['number'],
-                                            'description': part['description'],
-                                            'cost': cost,
-                                            'price': price,
-                                            'margin': margin
-                                        })
-
-                        if service_low_margin_parts:
-                            low_margin_services.append({
-                                'ro_number': ro['number'],
-                                'service_title': service['title'],
-                                'low_margin_parts': service_low_margin_parts
-                            })
-
-                if page >= response['total_pages']:
-                    break
-                page += 1
             logger.info(f"Got low margin servces of today")
             return low_margin_services
         except Exception as e:
             logger.error(f"Error getting low margin services: {str(e)}")
             return []  # Return an empty list on error
 
-    def get_car_count(self, closed_sales):
+    def get_car_count(self, closed_sales, repair_orders=None):
         try:
-            today = (datetime.now() - timedelta(days=1)).date().isoformat()
-            count = 0
-            page = 1
-            while True:
-                response = self.api.get_repair_orders(
-                    page=page,
-                    per_page=100,
-                    closed_after=f"{today}T00:00:00Z",
-                )
-                for car in response['results']:
-                    count += 1
-
-                if page >= response['total_pages']:
-                    break
-                page += 1
+            if repair_orders is None:
+                repair_orders = self.get_repair_orders_snapshot()
+            count = len(repair_orders)
             logger.info(f"Got car count of today")
             return count
         except Exception as e:
@@ -223,58 +261,26 @@ class DailyReports:
     def get_labour_efficiency(self , tech_hours):
         return (tech_hours['Billable Hours'].sum() / 40 ) *100
 
-    def get_closed_sales_of_day(self):
+    def get_closed_sales_of_day(self, repair_orders=None):
         try:
-            today = (datetime.now() - timedelta(days=1)).date().isoformat()
-            total_revenue = 0
-            total_cost = 0
-            total_parts_revenue = 0
-            total_parts_cost = 0
-            total_tire_revenue = 0
-            total_tire_cost = 0
-            closed_ros = []
-
-            page = 1
-            while True:
-                response = self.api.get_repair_orders(
-                    page=page,
-                    per_page=100,
-                    closed_after=f"{today}T00:00:00Z",
-                    status='invoice'
-                )
-
-                for ro in response['results']:
-                    ro_revenue, ro_cost, part_revenue, part_cost, tire_revenue, tire_cost = self._calculate_ro_financials(ro)
-                    total_revenue += ro_revenue
-                    total_cost += ro_cost
-                    total_parts_revenue += part_revenue
-                    total_parts_cost += part_cost
-                    total_tire_revenue += tire_revenue
-                    total_tire_cost += tire_cost
-                    closed_ros.append({
-                        'RO Number': ro['number'],
-                        'Revenue': ro_revenue,
-                        'Parts + Tires Cost': part_cost + tire_cost,
-                        'Parts + Tires Margin': (part_revenue + tire_revenue) - (part_cost + tire_cost),
-                        'Parts Margin %': (part_revenue - part_cost) / part_revenue * 100 if part_revenue > 0 else 0,
-                        'Tires Margin %': (tire_revenue - tire_cost) / tire_revenue * 100 if tire_revenue > 0 else 0,
-                        'RO Link':"https://bob-s-automotive-services.shop-ware.com/work_orders/" + str(ro['id'])
-                    })
-
-                if page >= response['total_pages']:
-                    break
-                page += 1
-            part_n_tire_marg = (total_tire_revenue + total_parts_revenue) - (total_parts_cost+total_tire_cost)
-            print(f"Total Parts Revenue: {total_parts_revenue} and Total Parts Cost : {total_parts_cost}")
-            parts_margin = ((total_parts_revenue - total_parts_cost) / total_parts_revenue * 100) if total_parts_revenue > 0 else 0
-            tire_margin  = ((total_tire_revenue - total_tire_cost) / total_tire_revenue * 100) if total_tire_revenue > 0 else 0
-
+            if repair_orders is None:
+                repair_orders = self.get_repair_orders_snapshot()
+
+            invoiced_ros = self._filter_status(repair_orders, 'invoice')
+            financials = compute_ro_financials(invoiced_ros, self.api.is_tyre)
+            closed_ros = [{
+                'RO Number': ro['number'],
+                'Revenue': row.revenue,
+                'Parts + Tires Cost': row.parts_tires_cost,
+                'Parts + Tires Margin': row.parts_tires_margin,
+                'Parts Margin %': row.parts_margin_pct,
+                'Tires Margin %': row.tires_margin_pct,
+                'RO Link':"https://bob-s-automotive-services.shop-ware.com/work_orders/" + str(ro['id'])
+            } for ro, row in zip(invoiced_ros, financials.itertuples())]
+
+            print(f"Total Parts Revenue: {financials['part_revenue'].sum()} and Total Parts Cost : {financials['part_cost'].sum()}")
             return {
-            'Total Revenue': total_revenue,
-            'Total Parts + Tires Cost': total_cost,
-            'Total Parts + Tires Margin': part_n_tire_marg,
-            'Total Parts Margin %': parts_margin,
-            'Total Tires Margin %': tire_margin,
+            **summarize_closed_sales(financials),
             'Closed ROs': closed_ros
              }
         except Exception as e:
@@ -288,190 +294,190 @@ class DailyReports:
             'Closed ROs': 0
              }  # Return zeros and empty list on error
 
-
-            
-    def _calculate_ro_financials(self, ro):
-        revenue = 0
-        cost = 0
-        part_revenue=0
-        part_cost=0
-        tire_revenue=0
-        tire_cost=0
-        try: 
-            for service in ro.get('services', []):
-                # Labor rate in cents
-                labor_rate_cents = service.get('labor_rate_cents', 0)
-
-                # Parts
-                for part in service.get('parts', []):
-                    quoted_price = part.get('quoted_price_cents', 0)
-                    quantity = part.get('quantity', 0)
-                    cost_cents = part.get('cost_cents', 0)
-
-                    revenue += quoted_price * quantity
-                    cost += cost_cents * quantity
-                    
-                    if not self.api.is_tyre(part['part_inventory_id']):# check for tires
-                        part_revenue+=quoted_price * quantity
-                        part_cost+=cost_cents * quantity
-                    else :                                             # tire calculation
-                        tire_revenue += quoted_price * quantity
-                        tire_cost+=cost_cents * quantity
-
-                # Labor
-                for labor in service.get('labors', []):
-                    if labor.get('hours', 0):
-                        hours = labor.get('hours', 0)
-                        revenue += hours * labor_rate_cents
-                    # Assuming labor cost is 50% of revenue, adjust if you have actual labor cost data
-                        # cost += hours * labor_rate_cents * 0.4
-
-                # Sublet
-                for sublet in service.get('sublets', []):
-                    if sublet.get('price_cents', 0) :
-                        revenue += sublet.get('price_cents', 0)
-                    if sublet.get('cost_cents', 0):
-                        cost += sublet.get('cost_cents', 0)
-
-                # Hazmat and Supply Fees (100% GP)
-                for hazmat in service.get('hazmats', []):
-                    if hazmat.get('fee_cents', 0) and hazmat.get('quantity', 0):
-                        fee = hazmat.get('fee_cents', 0)
-                        quantity = hazmat.get('quantity', 0)
-                        revenue += fee * quantity
-        except KeyError as e:
-            logger.error(f"Key error: {e}. Check if the keys exist in the service data.")
-        except TypeError as e:
-            logger.error(f"Type error: {e}. Check data types for calculations.")
-        except Exception as e:
-            logger.error(f"An unexpected error occurred: {e}")
-            # Add supply fee to revenue
+    def generate_html_report(self):
         try:
-            if ro.get('supply_fee_cents', 0):
-                revenue += ro.get('supply_fee_cents', 0)
-
-            # Apply discounts
-            if ro.get('part_discount_cents', 0):
-                revenue -= float(ro.get('part_discount_cents', 0))
+            self._repair_orders = {}
+            self._snapshot_complete = True
+            with self.timer.section('fetch'):
+                self.sync_store()
+            # Sections fetch what they need as they go, so without a store the API time lands in compute
+            with self.timer.section('compute'):
+                appointments_df = self.get_next_7_weekdays_appointments()
+                # categories_df = self.get_categories()
+                payments_df = self.get_payments()
+                # repair_orders_df = self.get_recent_repair_orders()
+                tech_hours_df, current_date = self.get_tech_billable_hours()
+                low_margin_services = self.get_low_margin_services()
+                low_margin_html = self._generate_low_margin_html(low_margin_services)
+                closed_sales = self.get_closed_sales_of_day()
+                self.record_daily_kpis()
+
+                closed_sales_html = self._generate_closed_sales_html(closed_sales,tech_hours_df)
+
+            with self.timer.section('render'):
+                return self._render_html_report(appointments_df, payments_df, tech_hours_df, current_date, closed_sales_html, low_margin_html)
+        except Exception as e:
+            logger.error(f"An error occurred while generating the HTML report: {e}")
+        finally:
+            self.timer.observe()
 
-            if ro.get('labor_discount_cents', 0):
-                revenue -= float(ro.get('labor_discount_cents', 0))
+    async def generate_html_report_async(self):
+        """
+        Same report as generate_html_report for an AsyncShopWareAPI. All ShopWare
+        fetches run concurrently on the event loop; the pandas and HTML work then
+        runs in a worker thread so the loop stays free.
+        """
+        try:
+            today = datetime.now().date()
+            yesterday = today - timedelta(days=1)
 
-        except (KeyError, TypeError, ValueError) as e:
-            logger.error(f"Error processing supply fees or discounts: {e}")
-            
-        return (revenue / 100,
-            cost / 100,
-            part_revenue / 100,
-            part_cost / 100,
-            tire_revenue / 100,
-            tire_cost / 100)  # Convert cents to dollars
+            async def fetch(description, coroutine):
+                # Sections degrade independently, as in the synchronous pipeline
+                try:
+                    return await coroutine
+                except Exception as e:
+                    logger.error(f"Error getting {description}: {str(e)}")
+                    return None
+
+            self._snapshot_complete = True
+            with self.timer.section('fetch'):
+                if self.store is not None:
+                    try:
+                        if not self.store_synced:
+                            await self.store.sync_async(self.api)
+                    except Exception as e:
+                        self._snapshot_complete = False
+                        logger.error(f"Error syncing local store, using data from the last sync: {str(e)}")
+                    self._repair_orders = {}
+                    appointments, payments_data, closed_ros = await asyncio.to_thread(
+                        lambda: (self._get_appointments(today - timedelta(days=30)), self._get_payments(yesterday), self.get_repair_orders_snapshot())
+                    )
+                else:
+                    appointments, payments_data, closed_ros = await asyncio.gather(
+                        fetch("appointments", self.api.get_all_pages(self.api.get_appointments, today - timedelta(days=30))),
+                        fetch("payments", self.api.get_all_pages(self.api.get_payments_of_day, yesterday)),
+                        fetch("repair orders", self.api.get_all_pages(self.api.get_repair_orders, per_page=100, closed_after=f"{yesterday}T00:00:00Z"))
+                    )
+                    self._snapshot_complete = closed_ros is not None
+                    closed_ros = parse_repair_orders(closed_ros['results']) if closed_ros else []
+                self._repair_orders = {1: closed_ros}
+
+                tech_ids = {labor.get('technician_id') for ro in closed_ros for service in ro.get('services', []) for labor in service.get('labors', [])}
+                part_ids = {part.get('part_inventory_id') for ro in closed_ros for service in ro.get('services', []) for part in service.get('parts', [])}
+                tech_names, _ = await asyncio.gather(
+                    self.api.get_staff_names(tech_ids),
+                    self.api.prime_tyre_index(part_ids)
+                )
 
-    def generate_html_report(self):
-        try:
-            appointments_df = self.get_next_7_weekdays_appointments()
-            # categories_df = self.get_categories()
-            payments_df = self.get_payments()
-            # repair_orders_df = self.get_recent_repair_orders()
-            tech_hours_df, current_date = self.get_tech_billable_hours()
-            low_margin_services = self.get_low_margin_services()
-            low_margin_html = self._generate_low_margin_html(low_margin_services)
-            closed_sales = self.get_closed_sales_of_day()
-
-            closed_sales_html = self._generate_closed_sales_html(closed_sales,tech_hours_df)
-
-            html_content = f"""
-            <!DOCTYPE html>
-            <html lang="en">
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Shop-Ware Reports</title>
-                <style type="text/css">
-                    body {{
-                        font-family: Arial, sans-serif;
-                        line-height: 1.6;
-                        color: #333333;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        padding: 20px;
-                    }}
-                    h1, h2, h3 {{
-                        color: #2c3e50;
-                    }}
-                    table {{
-                        width: 100%;
-                        border-collapse: collapse;
-                        margin-bottom: 20px;
-                    }}
-                    th, td {{
-                        padding: 10px;
-                        text-align: left;
-                        border-bottom: 1px solid #dddddd;
-                    }}
-                    th {{
-                        background-color: #f2f2f2;
-                    }}
-                    .closed-sales-summary {{
-                        background-color: #f2f2f2;
-                        padding: 15px;
-                        margin-bottom: 20px;
-                    }}
-                    .closed-sales-summary h3 {{
-                        margin-top: 0;
-                        border-bottom: 2px solid #2c3e50;
-                        padding-bottom: 10px;
-                    }}
-                    .highlight {{
-                        font-weight: bold;
-                        color: #27ae60;
-                    }}
-                    .closed-ro {{
-                        background-color: #ffffff;
-                        border: 1px solid #dddddd;
-                        padding: 15px;
-                        margin-bottom: 15px;
-                    }}
-                    .closed-ro h4 {{
-                        margin-top: 0;
-                        color: #2c3e50;
-                        border-bottom: 1px solid #dddddd;
-                        padding-bottom: 5px;
-                    }}
-                    .ro-gp {{
-                        font-weight: bold;
-                        color: #27ae60;
-                    }}
-                </style>
-            </head>
-            <body>
-                <h1>Shop-Ware Reports</h1>
-
-                <h2>Appointments for the Next 7 Weekdays</h2>
-                {appointments_df.to_html(index=False)}
-
-                <div class="section">
-                    <h2>Closed Sales of the Day</h2>
-                    {closed_sales_html}
-                </div>
-                
-                <h2>Today's Payments</h2>
-                {payments_df.to_html(index=False)}
-                
-                <h2>Technician Billable Hours (After {current_date})</h2>
-                {tech_hours_df.to_html(index=False)}
-                
-                <div class="section">
-                    <h2>Services with Low Parts Margin (&lt;40%)</h2>
-                    {low_margin_html}
-                </div>
-                
-            </body>
-            </html>
-            """
-            return html_content
+            def build():
+                with self.timer.section('compute'):
+                    appointments_df = self.get_next_7_weekdays_appointments(appointments) if appointments else pd.DataFrame()
+                    payments_df = self.get_payments(payments_data) if payments_data else pd.DataFrame()
+                    tech_hours_df, current_date = self.get_tech_billable_hours(tech_names=tech_names)
+                    low_margin_html = self._generate_low_margin_html(self.get_low_margin_services())
+                    closed_sales = self.get_closed_sales_of_day()
+                    self.record_daily_kpis()
+                    closed_sales_html = self._generate_closed_sales_html(closed_sales, tech_hours_df)
+                with self.timer.section('render'):
+                    return self._render_html_report(appointments_df, payments_df, tech_hours_df, current_date, closed_sales_html, low_margin_html)
+
+            return await asyncio.to_thread(build)
         except Exception as e:
             logger.error(f"An error occurred while generating the HTML report: {e}")
+        finally:
+            self.timer.observe()
+
+    def _render_html_report(self, appointments_df, payments_df, tech_hours_df, current_date, closed_sales_html, low_margin_html):
+        html_content = f"""
+        <!DOCTYPE html>
+        <html lang="en">
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>Shop-Ware Reports</title>
+            <style type="text/css">
+                body {{
+                    font-family: Arial, sans-serif;
+                    line-height: 1.6;
+                    color: #333333;
+                    max-width: 600px;
+                    margin: 0 auto;
+                    padding: 20px;
+                }}
+                h1, h2, h3 {{
+                    color: #2c3e50;
+                }}
+                table {{
+                    width: 100%;
+                    border-collapse: collapse;
+                    margin-bottom: 20px;
+                }}
+                th, td {{
+                    padding: 10px;
+                    text-align: left;
+                    border-bottom: 1px solid #dddddd;
+                }}
+                th {{
+                    background-color: #f2f2f2;
+                }}
+                .closed-sales-summary {{
+                    background-color: #f2f2f2;
+                    padding: 15px;
+                    margin-bottom: 20px;
+                }}
+                .closed-sales-summary h3 {{
+                    margin-top: 0;
+                    border-bottom: 2px solid #2c3e50;
+                    padding-bottom: 10px;
+                }}
+                .highlight {{
+                    font-weight: bold;
+                    color: #27ae60;
+                }}
+                .closed-ro {{
+                    background-color: #ffffff;
+                    border: 1px solid #dddddd;
+                    padding: 15px;
+                    margin-bottom: 15px;
+                }}
+                .closed-ro h4 {{
+                    margin-top: 0;
+                    color: #2c3e50;
+                    border-bottom: 1px solid #dddddd;
+                    padding-bottom: 5px;
+                }}
+                .ro-gp {{
+                    font-weight: bold;
+                    color: #27ae60;
+                }}
+            </style>
+        </head>
+        <body>
+            <h1>Shop-Ware Reports</h1>
+
+            <h2>Appointments for the Next 7 Weekdays</h2>
+            {appointments_df.to_html(index=False)}
+
+            <div class="section">
+                <h2>Closed Sales of the Day</h2>
+                {closed_sales_html}
+            </div>
+            
+            <h2>Today's Payments</h2>
+            {payments_df.to_html(index=False)}
+            
+            <h2>Technician Billable Hours (After {current_date})</h2>
+            {tech_hours_df.to_html(index=False)}
+            
+            <div class="section">
+                <h2>Services with Low Parts Margin (&lt;40%)</h2>
+                {low_margin_html}
+            </div>
+            
+        </body>
+        </html>
+        """
+        return html_content
 
 
     def save_html_report(self, html_content, filename='appointment_report.html'):
@@ -503,8 +509,9 @@ class DailyReports:
             """
         return html
 
-    def _generate_closed_sales_html(self, closed_sales,tech_hours_df):
-        car_count= self.get_car_count(closed_sales)
+    def _generate_closed_sales_html(self, closed_sales,tech_hours_df, car_count=None):
+        if car_count is None:
+            car_count= self.get_car_count(closed_sales)
         avg_ro= self.get_avg_ro(closed_sales,car_count)
         labor_efficiency=self.get_labour_efficiency(tech_hours_df)
         html = f"""
@@ -0,0 +1,157 @@
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta, timezone
+import logging
+import os
+import sqlite3
+import threading
+import pandas as pd
+import pytz
+from apps.financials import FINANCIAL_COLUMNS, compute_ro_financials
+from apps.repairorderindex import RepairOrderIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+# Per-day totals the weekly trends are built from; margin % and avg RO are
+# derived from these sums when read, so weeks aggregate exactly
+KPI_COLUMNS = FINANCIAL_COLUMNS + ['car_count', 'billable_hours']
+
+
+def _billable_hours(repair_orders):
+    return sum(labor.hours
+               for ro in repair_orders
+               for service in ro.services
+               for labor in service.labors
+               if labor.hours and labor.technician_id)
+
+
+def compute_daily_kpis(index, is_tyre, days):
+    """
+    KPI totals for each of `days` from a RepairOrderIndex.
+
+    Financials and billable hours cover invoiced ROs, car count every RO
+    closed that day. All days' ROs go through the financials engine in one
+    batch.
+
+    :return: DataFrame indexed by date with the KPI_COLUMNS, one row per day
+    """
+    days = list(days)
+    dates = []
+    invoiced_ros = []
+    for day in days:
+        for ro in index.on(day, status='invoice'):
+            dates.append(day)
+            invoiced_ros.append(ro)
+    financials = compute_ro_financials(invoiced_ros, is_tyre)
+    financials['date'] = dates
+    kpis = financials.groupby('date')[FINANCIAL_COLUMNS].sum().reindex(days, fill_value=0)
+    kpis['car_count'] = [len(index.on(day)) for day in days]
+    kpis['billable_hours'] = [_billable_hours(index.on(day, status='invoice')) for day in days]
+    return kpis
+
+
+class DailyKpiAccumulator:
+    """
+    Per-day KPI totals built up one page of repair orders at a time, so a
+    long window never has all of its ROs in memory at once.
+    """
+
+    def __init__(self, days, is_tyre, timezone=None):
+        self.days = list(days)
+        self.is_tyre = is_tyre
+        self.timezone = timezone
+        self.totals = None
+
+    def add(self, repair_orders):
+        kpis = compute_daily_kpis(RepairOrderIndex(repair_orders, self.timezone), self.is_tyre, self.days)
+        self.totals = kpis if self.totals is None else self.totals + kpis
+
+    def kpis(self):
+        if self.totals is None:
+            self.add([])
+        return self.totals
+
+
+class DailyKpiRollup:
+    """
+    One row of KPI totals per business day, persisted in SQLite.
+
+    The daily job records each day once it is over; the weekly report reads
+    its trend series from here and only recomputes the days that are
+    missing (today, and any day the daily job did not run).
+    """
+
+    def __init__(self, path=None, timezone=None):
+        self.path = path or os.getenv('KPI_ROLLUP_PATH', 'data/daily_kpis.db')
+        self.timezone = pytz.timezone(timezone or os.getenv('BUSINESS_TIMEZONE', 'UTC'))
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_table()
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _create_table(self):
+        columns = "".join(f", {column} {'INTEGER' if column == 'car_count' else 'REAL'} NOT NULL" for column in KPI_COLUMNS)
+        with self._connect() as connection:
+            connection.execute(f"CREATE TABLE IF NOT EXISTS daily_kpis (date TEXT PRIMARY KEY{columns}, computed_at TEXT NOT NULL)")
+
+    def complete_days(self, start, end=None):
+        """
+        Business dates lying entirely between the aware datetimes start and
+        end (now by default), i.e. the days a fetch over that window covers.
+        """
+        local_start = start.astimezone(self.timezone)
+        first = local_start.date() if local_start.time() == time() else local_start.date() + timedelta(days=1)
+        last = (end or datetime.now(timezone.utc)).astimezone(self.timezone).date()
+        return [first + timedelta(days=i) for i in range((last - first).days)]
+
+    def save(self, kpis):
+        computed_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        rows = [(day.isoformat(), *(float(row[column]) for column in FINANCIAL_COLUMNS), int(row['car_count']), float(row['billable_hours']), computed_at)
+                for day, row in kpis.iterrows()]
+        placeholders = ", ".join("?" * (len(KPI_COLUMNS) + 2))
+        with self._lock, self._connect() as connection:
+            connection.executemany(f"INSERT OR REPLACE INTO daily_kpis (date, {', '.join(KPI_COLUMNS)}, computed_at) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def load(self, days):
+        """
+        Stored rows for whichever of `days` have one, indexed by date.
+        """
+        days = sorted(days)
+        if not days:
+            return pd.DataFrame(columns=KPI_COLUMNS)
+        with self._connect() as connection:
+            rows = connection.execute(
+                f"SELECT date, {', '.join(KPI_COLUMNS)} FROM daily_kpis WHERE date BETWEEN ? AND ?",
+                (days[0].isoformat(), days[-1].isoformat())
+            ).fetchall()
+        kpis = pd.DataFrame(rows, columns=['date'] + KPI_COLUMNS)
+        kpis['date'] = [datetime.strptime(day, "%Y-%m-%d").date() for day in kpis['date']]
+        kpis = kpis.set_index('date')
+        return kpis[kpis.index.isin(days)]
+
+    def record(self, repair_orders, is_tyre, start, end=None):
+        """
+        Compute and persist the rows for every business day fully inside the
+        window the repair orders were fetched for.
+
+        :param repair_orders: Every RO closed between start and end, any status
+        :param start: Aware datetime the fetch started from (its closed_after)
+        :return: The dates recorded
+        """
+        days = self.complete_days(start, end)
+        index = RepairOrderIndex(repair_orders, self.timezone.zone)
+        self.save(compute_daily_kpis(index, is_tyre, days))
+        logger.info(f"Recorded daily KPIs for {', '.join(day.isoformat() for day in days) or 'no complete days'}")
+        return days
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from utils.metrics import SHOPWARE_RATE_LIMIT_WAIT_SECONDS, SHOPWARE_THROTTLED
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every ShopWare call in the process.
+
+    Tokens refill at `rate` per second up to `burst`. Callers reserve a token
+    and sleep until it is theirs, so concurrent threads and coroutines queue
+    fairly instead of racing. A 429 halves the rate (and, with Retry-After,
+    pauses the bucket); each success then adds back a small step until the
+    configured rate is reached again.
+    """
+
+    # Ignore further 429s for this long after slowing down, so one burst of
+    # throttled in-flight calls halves the rate once rather than N times
+    THROTTLE_COOLDOWN = 1.0
+
+    def __init__(self, rate=None, burst=None, min_rate=None):
+        self.max_rate = rate or float(os.getenv('SHOPWARE_RATE_LIMIT', 10))
+        self.burst = burst or float(os.getenv('SHOPWARE_RATE_BURST', 20))
+        self.min_rate = min_rate or float(os.getenv('SHOPWARE_MIN_RATE', 0.5))
+        self.rate = self.max_rate
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._throttled_at = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self):
+        """
+        Take a token and return how long the caller must wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+            self.requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        SHOPWARE_RATE_LIMIT_WAIT_SECONDS.observe(wait)
+        return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_throttled(self, retry_after=None):
+        """
+        Slow down after a 429: halve the rate and, when the server said how
+        long to back off, hold every caller for that long.
+        """
+        SHOPWARE_THROTTLED.inc()
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if self._throttled_at is not None and now - self._throttled_at < self.THROTTLE_COOLDOWN:
+                return
+            self._throttled_at = now
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._tokens -= retry_after * self.rate
+        logger.warning(f"ShopWare throttled the client, lowering request rate to {self.rate:.2f}/s")
+
+    def on_success(self):
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'rate': round(self.rate, 3),
+                'total_wait': round(self.total_wait, 3),
+                'mean_wait': round(self.total_wait / self.requests, 4) if self.requests else 0.0,
+                'max_wait': round(self.max_wait, 3)
+            }
+
+
+_shared_rate_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_rate_limiter():
+    """
+    The process-wide limiter every ShopWareAPI uses unless given its own.
+    """
+    global _shared_rate_limiter
+    with _shared_lock:
+        if _shared_rate_limiter is None:
+            _shared_rate_limiter = RateLimiter()
+        return _shared_rate_limiter
@@ -0,0 +1,147 @@
+class Record:
+    """
+    Base for compact __slots__ records of the repair-order fields the reports read.
+
+    ShopWare payloads carry customer, vehicle, notes and audit fields the
+    reports never touch. Projecting each RO into records when it is ingested
+    drops all of that, and the hot loops read attributes instead of hashing
+    dict keys. Records still answer ro['number'] and ro.get('services') so
+    code written against raw dicts keeps working.
+    """
+
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        # Missing and null fields both come back as the default, like dict.get on a sparse payload
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def to_dict(self):
+        return {name: self._plain(getattr(self, name)) for name in self.__slots__}
+
+    @staticmethod
+    def _plain(value):
+        if isinstance(value, Record):
+            return value.to_dict()
+        if isinstance(value, tuple):
+            return [Record._plain(item) for item in value]
+        return value
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+
+class Part(Record):
+    __slots__ = ('part_inventory_id', 'quoted_price_cents', 'cost_cents', 'quantity', 'number', 'description')
+
+    def __init__(self, part_inventory_id, quoted_price_cents, cost_cents, quantity, number, description):
+        self.part_inventory_id = part_inventory_id
+        self.quoted_price_cents = quoted_price_cents
+        self.cost_cents = cost_cents
+        self.quantity = quantity
+        self.number = number
+        self.description = description
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('part_inventory_id'), data.get('quoted_price_cents'), data.get('cost_cents'),
+                   data.get('quantity'), data.get('number'), data.get('description'))
+
+
+class Labor(Record):
+    __slots__ = ('hours', 'technician_id')
+
+    def __init__(self, hours, technician_id):
+        self.hours = hours
+        self.technician_id = technician_id
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('hours'), data.get('technician_id'))
+
+
+class Sublet(Record):
+    __slots__ = ('price_cents', 'cost_cents')
+
+    def __init__(self, price_cents, cost_cents):
+        self.price_cents = price_cents
+        self.cost_cents = cost_cents
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('price_cents'), data.get('cost_cents'))
+
+
+class Hazmat(Record):
+    __slots__ = ('fee_cents', 'quantity')
+
+    def __init__(self, fee_cents, quantity):
+        self.fee_cents = fee_cents
+        self.quantity = quantity
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('fee_cents'), data.get('quantity'))
+
+
+class Service(Record):
+    __slots__ = ('title', 'labor_rate_cents', 'parts', 'labors', 'sublets', 'hazmats')
+
+    def __init__(self, title, labor_rate_cents, parts=(), labors=(), sublets=(), hazmats=()):
+        self.title = title
+        self.labor_rate_cents = labor_rate_cents
+        self.parts = parts
+        self.labors = labors
+        self.sublets = sublets
+        self.hazmats = hazmats
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get('title'),
+            data.get('labor_rate_cents'),
+            tuple(Part.from_dict(part) for part in data.get('parts') or ()),
+            tuple(Labor.from_dict(labor) for labor in data.get('labors') or ()),
+            tuple(Sublet.from_dict(sublet) for sublet in data.get('sublets') or ()),
+            tuple(Hazmat.from_dict(hazmat) for hazmat in data.get('hazmats') or ())
+        )
+
+
+class RepairOrder(Record):
+    __slots__ = ('id', 'number', 'status', 'closed_at', 'supply_fee_cents', 'part_discount_cents', 'labor_discount_cents', 'services')
+
+    def __init__(self, id, number, status, closed_at, supply_fee_cents, part_discount_cents, labor_discount_cents, services=()):
+        self.id = id
+        self.number = number
+        self.status = status
+        self.closed_at = closed_at
+        self.supply_fee_cents = supply_fee_cents
+        self.part_discount_cents = part_discount_cents
+        self.labor_discount_cents = labor_discount_cents
+        self.services = services
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get('id'),
+            data.get('number'),
+            data.get('status'),
+            data.get('closed_at'),
+            data.get('supply_fee_cents'),
+            data.get('part_discount_cents'),
+            data.get('labor_discount_cents'),
+            tuple(Service.from_dict(service) for service in data.get('services') or ())
+        )
+
+
+def parse_repair_orders(repair_orders):
+    """
+    Project raw API repair orders into RepairOrder records; records pass through.
+    """
+    return [ro if isinstance(ro, RepairOrder) else RepairOrder.from_dict(ro) for ro in repair_orders]
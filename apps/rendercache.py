@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import pandas as pd
+from utils.metrics import RENDER_CACHE_LOOKUPS
+
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_part(digest, part):
+    if isinstance(part, pd.DataFrame):
+        digest.update(json.dumps([list(map(str, part.columns)), list(map(str, part.dtypes))]).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(part, index=False).values.tobytes())
+    elif isinstance(part, dict):
+        for name in sorted(part):
+            _hash_part(digest, name)
+            _hash_part(digest, part[name])
+    elif isinstance(part, (list, tuple)):
+        digest.update(b'[')
+        for item in part:
+            _hash_part(digest, item)
+        digest.update(b']')
+    else:
+        digest.update(json.dumps(part, default=str).encode('utf-8'))
+    digest.update(b'\0')
+
+
+def content_key(*parts):
+    """
+    SHA-256 over the given parts. DataFrames, including those nested in dicts
+    and lists, hash by their column names, dtypes and values; everything else
+    by its JSON form. Equal inputs give equal keys across runs and processes.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        _hash_part(digest, part)
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Size-bounded on-disk cache of rendered charts and other report fragments,
+    addressed by a hash of everything that went into rendering them.
+
+    Entries are files under `path`. Reading one bumps its mtime, and when the
+    cache grows past max_bytes the least recently used entries are deleted
+    until it is back under 90% of the limit. Writes go through a temporary
+    file and a rename, so runs sharing the directory never see half an entry.
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or os.getenv('RENDER_CACHE_PATH', 'data/render_cache')
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('RENDER_CACHE_MAX_BYTES', 50 * 2 ** 20))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def _entries(self):
+        for directory, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith('.tmp'):
+                    yield os.path.join(directory, name)
+
+    def get(self, key):
+        """
+        Return the cached bytes for `key`, or None.
+        """
+        if not self.enabled:
+            return None
+        entry = self._entry_path(key)
+        try:
+            with open(entry, 'rb') as f:
+                value = f.read()
+            os.utime(entry)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            RENDER_CACHE_LOOKUPS.labels('miss').inc()
+            return None
+        except OSError as e:
+            logger.error(f"Could not read render cache entry {key}: {e}")
+            with self._lock:
+                self.misses += 1
+            RENDER_CACHE_LOOKUPS.labels('miss').inc()
+            return None
+        with self._lock:
+            self.hits += 1
+        RENDER_CACHE_LOOKUPS.labels('hit').inc()
+        return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        entry = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            tmp_path = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, entry)
+        except OSError as e:
+            logger.error(f"Could not write render cache entry {key}: {e}")
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(os.path.getsize(path) for path in self._entries())
+            else:
+                self._size += len(value)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def get_or_render(self, key, render):
+        """
+        Return the cached value for `key`, calling `render()` and caching its result on a miss.
+        """
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.put(key, value)
+        return value
+
+    def _evict(self):
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'bytes': self._size}
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_render_cache():
+    """
+    The process-wide cache ChartRenderer uses unless given its own.
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = RenderCache()
+        return _shared_cache
@@ -0,0 +1,51 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+import logging
+import os
+import pytz
+from apps.records import parse_repair_orders
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_closed_at(closed_at, timezone):
+    """
+    Business date of a ShopWare timestamp such as '2024-05-01T18:30:00Z'.
+    """
+    closed_at = datetime.fromisoformat(str(closed_at).replace('Z', '+00:00'))
+    if closed_at.tzinfo is None:
+        closed_at = pytz.utc.localize(closed_at)
+    return closed_at.astimezone(timezone).date()
+
+
+class RepairOrderIndex:
+    """
+    Repair orders bucketed by the business date they were closed on.
+
+    closed_at is parsed once per RO when the index is built; daily and weekly
+    aggregates then read whole buckets instead of rescanning every RO for
+    every day. Dates are taken in BUSINESS_TIMEZONE (UTC by default, which
+    matches the dates ShopWare reports).
+    """
+
+    def __init__(self, repair_orders, timezone=None):
+        self.timezone = pytz.timezone(timezone or os.getenv('BUSINESS_TIMEZONE', 'UTC'))
+        self.by_date = defaultdict(list)
+        for ro in parse_repair_orders(repair_orders):
+            if not ro.closed_at:
+                continue
+            try:
+                self.by_date[parse_closed_at(ro.closed_at, self.timezone)].append(ro)
+            except ValueError as e:
+                logger.error(f"Skipping RO {ro.number} with unparseable closed_at: {e}")
+
+    @staticmethod
+    def _as_date(day):
+        return day.date() if isinstance(day, datetime) else day
+
+    def on(self, day, status=None):
+        repair_orders = self.by_date.get(self._as_date(day), [])
+        if status is not None:
+            return [ro for ro in repair_orders if ro.status == status]
+        return repair_orders
@@ -0,0 +1,47 @@
+import base64
+import re
+import uuid
+
+
+CONTENT_ID = re.compile(r'cid:([0-9a-f]{32})')
+
+
+class Report:
+    """
+    A rendered report: HTML that references its images by cid: URLs, plus the
+    raw image bytes.
+
+    Emails attach the images as MIME parts exactly as rendered, so sending
+    never parses the HTML or round-trips the images through base64.
+    inline_html() embeds them as data URIs for a self-contained file.
+    """
+
+    def __init__(self, html='', images=None):
+        self.html = html
+        self.images = images if images is not None else {}
+
+    def add_image(self, content, subtype='png'):
+        """
+        Register image bytes and return the cid: URL to use as its src.
+
+        :param content: Image bytes
+        :param subtype: Image MIME subtype ('png', 'svg+xml')
+        """
+        content_id = uuid.uuid4().hex
+        self.images[content_id] = (content, subtype)
+        return f"cid:{content_id}"
+
+    def inline_html(self):
+        """
+        HTML with every image embedded as a base64 data URI.
+        """
+        def data_uri(match):
+            content, subtype = self.images[match.group(1)]
+            return f"data:image/{subtype};base64,{base64.b64encode(content).decode()}"
+
+        return CONTENT_ID.sub(lambda match: data_uri(match) if match.group(1) in self.images else match.group(0), self.html)
+
+    @property
+    def size(self):
+        # Bytes of HTML and images before transfer encoding
+        return len(self.html.encode('utf-8')) + sum(len(content) for content, _ in self.images.values())
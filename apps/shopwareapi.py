@@ -1,18 +1,90 @@
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import logging
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
+from apps.cassette import Cassette, CassetteAdapter
+from apps.ratelimiter import get_shared_rate_limiter
+from apps.staffdirectory import StaffDirectory
+from apps.tireindex import TireIndex
+from utils.metrics import SHOPWARE_LOOKUPS, count_lookups, observe_request
 
 # Load environment variables
 load_dotenv()
 
 
+logger = logging.getLogger(__name__)
+
+
+def inventory_id(value):
+    # IDs that went through a float column (123.0) must look up and fetch as 123
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
 class ShopWareAPI:
-    def __init__(self, base_url):
+    # Transient statuses worth retrying: rate limiting and server-side failures
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url, pool_size=None, max_retries=None, backoff_factor=None, max_backoff=None, timeout=None, tire_index=None, page_workers=None, staff_directory=None, rate_limiter=None, cassette_mode=None):
         self.base_url = base_url
         self.api_partner_id = os.getenv('X-API-PARTNER-ID')
         self.api_secret = os.getenv('X-API-SECRET')
         self.tenant_id = os.getenv('TENANT_ID')
+        self.pool_size = pool_size or int(os.getenv('SHOPWARE_POOL_SIZE', 10))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SHOPWARE_MAX_RETRIES', 5))
+        self.backoff_factor = backoff_factor if backoff_factor is not None else float(os.getenv('SHOPWARE_BACKOFF_FACTOR', 0.5))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.getenv('SHOPWARE_MAX_BACKOFF', 30))
+        self.timeout = timeout or float(os.getenv('SHOPWARE_TIMEOUT', 30))
+        self.page_workers = page_workers or int(os.getenv('SHOPWARE_PAGE_WORKERS', 8))
+        self.page_prefetch = int(os.getenv('SHOPWARE_PAGE_PREFETCH', 2))
+        # 'record' captures every response to a cassette, 'replay' serves from one offline
+        self.cassette_mode = cassette_mode or os.getenv('SHOPWARE_CASSETTE_MODE') or None
+        self.cassette = Cassette() if self.cassette_mode else None
+        self.session = self._create_session()
+        # Shared by default so every client in the process draws from one budget
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        self.tire_index = tire_index or TireIndex()
+        self._tire_index_ready = False
+        self._tire_index_lock = threading.Lock()
+        self.staff_directory = staff_directory or StaffDirectory()
+        self._staff_directory_ready = False
+        self._staff_directory_lock = threading.Lock()
+
+    def _create_session(self):
+        """
+        Build a keep-alive session whose connection pool is shared by every call,
+        so a report run pays for the TCP/TLS handshake once per connection.
+        """
+        session = requests.Session()
+        # Retries are handled in _get so that Retry-After and jitter apply uniformly
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        if self.cassette_mode:
+            adapter = CassetteAdapter(self.cassette, self.cassette_mode, adapter)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+        return session
+
+    def close(self):
+        self.session.close()
+        if self.cassette_mode == 'record':
+            self.cassette.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def get_headers(self):
         return {
@@ -21,62 +93,218 @@ class ShopWareAPI:
             'Accept': 'application/json'
         }
 
+    def _backoff_delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait before the next attempt. A Retry-After header from the
+        server wins; otherwise use exponential backoff with full jitter.
+        """
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def _record_rate_limit(self, status_code, retry_after=None):
+        if status_code == 429:
+            self.rate_limiter.on_throttled(self._backoff_delay(0, retry_after) if retry_after else None)
+        elif status_code < 400:
+            self.rate_limiter.on_success()
+
+    def _get(self, path, params=None):
+        url = f"{self.base_url}/api/v1/tenants/{self.tenant_id}/{path}"
+        page = params.get('page') if params else None
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=self.get_headers(), params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                observe_request(path, 'error', time.perf_counter() - started, page=page)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"GET {path} failed ({e}), retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            else:
+                observe_request(path, response.status_code, time.perf_counter() - started, len(response.content), page)
+                self._record_rate_limit(response.status_code, response.headers.get('Retry-After'))
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                delay = self._backoff_delay(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"GET {path} returned {response.status_code}, retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+            attempt += 1
+
+    def get_all_pages(self, fetch, *args, **kwargs):
+        """
+        Fetch every page of a paginated endpoint and merge the results.
+
+        Page 1 is fetched first to learn total_pages, then pages 2..N are pulled
+        concurrently through a bounded thread pool. Results keep page order.
+
+        :param fetch: Bound API method accepting a page keyword, e.g. self.get_repair_orders
+        :return: Response dict shaped like a single page holding every result
+        """
+        first_page = fetch(*args, page=1, **kwargs)
+        total_pages = first_page.get('total_pages', 1) or 1
+        pages = [first_page]
+        if total_pages > 1:
+            with ThreadPoolExecutor(max_workers=min(self.page_workers, total_pages - 1)) as executor:
+                pages.extend(executor.map(lambda page: fetch(*args, page=page, **kwargs), range(2, total_pages + 1)))
+
+        results = [result for response in pages for result in response.get('results', [])]
+        return {
+            "results": results,
+            "limit": len(results),
+            "limited": False,
+            "total_count": first_page.get('total_count', len(results)),
+            "current_page": 1,
+            "total_pages": total_pages
+        }
+
+    def iter_pages(self, fetch, *args, prefetch=None, **kwargs):
+        """
+        Yield each page's results in order, downloading the next `prefetch`
+        pages in the background while the caller works on the current one.
+
+        Unlike get_all_pages only a few pages are held at once, so callers that
+        aggregate as they go keep memory flat however long the window is.
+        """
+        prefetch = max(1, self.page_prefetch if prefetch is None else prefetch)
+        first_page = fetch(*args, page=1, **kwargs)
+        total_pages = first_page.get('total_pages', 1) or 1
+        yield first_page.get('results', [])
+        if total_pages == 1:
+            return
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            pending = deque()
+            next_page = 2
+            while next_page <= total_pages or pending:
+                while next_page <= total_pages and len(pending) < prefetch:
+                    pending.append(executor.submit(fetch, *args, page=next_page, **kwargs))
+                    next_page += 1
+                yield pending.popleft().result().get('results', [])
+
+    def iter_results(self, fetch, *args, prefetch=None, **kwargs):
+        """
+        iter_pages flattened to individual records.
+        """
+        for results in self.iter_pages(fetch, *args, prefetch=prefetch, **kwargs):
+            yield from results
+
     def get_appointments(self, updated_after, page=1, per_page=100):
-        url = f"{self.base_url}/api/v1/tenants/{self.tenant_id}/appointments"
         params = {
             'updated_after': updated_after.isoformat(),
             'page': page,
             'per_page': per_page
         }
-        response = requests.get(url, headers=self.get_headers(), params=params)
-        response.raise_for_status()
-        return response.json()
+        return self._get("appointments", params=params)
 
     def get_categories(self):
-        url = f"{self.base_url}/api/v1/tenants/{self.tenant_id}/categories"
-        response = requests.get(url, headers=self.get_headers())
-        response.raise_for_status()
-        return response.json()
+        return self._get("categories")
 
     def get_payments_of_day(self,updated_after, page=1, per_page=100):
-        url = f"{self.base_url}/api/v1/tenants/{self.tenant_id}/payments"
         params = {
             "page": page,
             "per_page": per_page,
             "updated_after": updated_after.isoformat()
         }
-        response = requests.get(url, headers=self.get_headers(), params=params)
-        response.raise_for_status()
-        return response.json()
+        return self._get("payments", params=params)
 
     def get_repair_orders(self, page=1, per_page=100, **kwargs):
-        url = f"{self.base_url}/api/v1/tenants/{self.tenant_id}/repair_orders"
         params = {
             'page': page,
             'per_page': per_page,
             **kwargs
         }
-        response = requests.get(url, headers=self.get_headers(), params=params)
-        response.raise_for_status()
-        return response.json()
+        return self._get("repair_orders", params=params)
 
     def get_staff_member(self, staff_id):
-        url = f"{self.base_url}/api/v1/tenants/{self.tenant_id}/staffs/{staff_id}"
-        response = requests.get(url, headers=self.get_headers())
-        response.raise_for_status()
-        return response.json()
+        return self._get(f"staffs/{staff_id}")
+
+    def get_staffs(self, page=1, per_page=100):
+        params = {
+            'page': page,
+            'per_page': per_page
+        }
+        return self._get("staffs", params=params)
 
     def get_inventory(self, inventory_item_id):
-        url = f"{self.base_url}/api/v1/tenants/{self.tenant_id}/inventories/{inventory_item_id}"
-        response = requests.get(url, headers=self.get_headers())
-        response.raise_for_status()
-        return response.json()
-    
+        return self._get(f"inventories/{inventory_item_id}")
+
+    def get_inventories(self, page=1, per_page=100, **kwargs):
+        params = {
+            'page': page,
+            'per_page': per_page,
+            **kwargs
+        }
+        return self._get("inventories", params=params)
+
+    def _ensure_tire_index(self):
+        # Refresh once per API instance; the first is_tyre call pays for it
+        with self._tire_index_lock:
+            if self._tire_index_ready:
+                return
+            try:
+                self.tire_index.refresh(self)
+            except Exception as e:
+                logger.error(f"Could not refresh tire index, falling back to per-item lookups: {e}")
+            self._tire_index_ready = True
+
     def is_tyre(self,inventory_item_id):
-        try:
-            inventory_item=self.get_inventory(inventory_item_id)
-            if inventory_item.get("part_type","None") == "Tire" or inventory_item.get("reporting_category","None") == "Tires":
-                return True
-        except:
-            ...
-        return False
\ No newline at end of file
+        if inventory_item_id is None:
+            return False
+        inventory_item_id = inventory_id(inventory_item_id)
+        if not self._tire_index_ready:
+            self._ensure_tire_index()
+        is_tire = self.tire_index.lookup(inventory_item_id)
+        SHOPWARE_LOOKUPS.labels('inventory', 'miss' if is_tire is None else 'hit').inc()
+        if is_tire is None:
+            try:
+                is_tire = TireIndex.classify(self.get_inventory(inventory_item_id))
+            except Exception as e:
+                logger.error(f"Error fetching inventory item {inventory_item_id}: {e}")
+                return False
+            self.tire_index.remember(inventory_item_id, is_tire)
+        return is_tire
+
+    def _ensure_staff_directory(self):
+        # Reload the staff list at most once per API instance, and only when stale
+        with self._staff_directory_lock:
+            if self._staff_directory_ready:
+                return
+            if self.staff_directory.is_stale():
+                try:
+                    self.staff_directory.refresh(self)
+                except Exception as e:
+                    logger.error(f"Could not refresh staff directory, falling back to per-member lookups: {e}")
+            self._staff_directory_ready = True
+
+    def get_staff_names(self, staff_ids):
+        """
+        Display names for a batch of staff IDs from the staff directory.
+        IDs it does not know are fetched concurrently and added to it.
+
+        :return: Dict of staff ID to name, 'Unknown (ID: ...)' when not found
+        """
+        staff_ids = {staff_id for staff_id in staff_ids if staff_id}
+        self._ensure_staff_directory()
+        unknown_ids = [staff_id for staff_id in staff_ids if self.staff_directory.lookup(staff_id) is None]
+        count_lookups('staff', hits=len(staff_ids) - len(unknown_ids), misses=len(unknown_ids))
+        if unknown_ids:
+            def fetch(staff_id):
+                try:
+                    self.staff_directory.add(self.get_staff_member(staff_id))
+                except Exception as e:
+                    logger.error(f"Error fetching technician name for ID {staff_id}: {str(e)}")
+
+            with ThreadPoolExecutor(max_workers=min(self.page_workers, len(unknown_ids))) as executor:
+                list(executor.map(fetch, unknown_ids))
+            self.staff_directory.save()
+        return self.staff_directory.resolve(staff_ids)
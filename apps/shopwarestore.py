@@ -0,0 +1,192 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+# Resources mirrored locally, with the extra columns we query them by
+RESOURCES = {
+    'repair_orders': ['status', 'closed_at'],
+    'appointments': ['start_at'],
+    'payments': []
+}
+
+
+class ShopWareStore:
+    """
+    Local SQLite mirror of repair orders, appointments and payments.
+
+    sync() asks ShopWare only for records changed since the stored
+    high-water mark (updated_after) and upserts them, so after the first
+    backfill a report run transfers the delta instead of its whole window.
+    The report classes then read their datasets from here.
+    """
+
+    # Re-ask for a little history on each sync so records updated in the same
+    # second as the previous high-water mark are not missed; upserts make it free
+    SYNC_OVERLAP = timedelta(minutes=5)
+
+    def __init__(self, path=None, backfill_days=None):
+        self.path = path or os.getenv('SHOPWARE_STORE_PATH', 'data/shopware.db')
+        self.backfill_days = backfill_days or int(os.getenv('SHOPWARE_STORE_BACKFILL_DAYS', 180))
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_tables()
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _create_tables(self):
+        with self._connect() as connection:
+            # WAL lets report reads proceed while a sync is writing
+            connection.execute("PRAGMA journal_mode=WAL")
+            for resource, columns in RESOURCES.items():
+                extra_columns = "".join(f", {column} TEXT" for column in columns)
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {resource} (id INTEGER PRIMARY KEY, updated_at TEXT{extra_columns}, data TEXT NOT NULL)")
+                for column in columns:
+                    connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{resource}_{column} ON {resource} ({column})")
+            connection.execute("CREATE TABLE IF NOT EXISTS sync_state (resource TEXT PRIMARY KEY, high_water TEXT)")
+            # Where each resource's first sync started: the mirror holds nothing older
+            connection.execute("CREATE TABLE IF NOT EXISTS backfill_state (resource TEXT PRIMARY KEY, since TEXT NOT NULL)")
+
+    def get_high_water(self, resource):
+        with self._connect() as connection:
+            row = connection.execute("SELECT high_water FROM sync_state WHERE resource = ?", (resource,)).fetchone()
+        return row[0] if row else None
+
+    def _record_backfill(self, resource, since):
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT OR IGNORE INTO backfill_state (resource, since) VALUES (?, ?)", (resource, self._timestamp(since)))
+
+    def covered_since(self, resource='repair_orders'):
+        """
+        Earliest time the mirror holds every record of `resource` from. A
+        record closed after it was updated after it too, so repair orders
+        closed since then are all here; anything older must come from the API.
+        Stores synced before this was recorded fall back to the backfill window.
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT since FROM backfill_state WHERE resource = ?", (resource,)).fetchone()
+        if row:
+            return datetime.fromisoformat(row[0].replace('Z', '+00:00'))
+        return datetime.now(timezone.utc) - timedelta(days=self.backfill_days)
+
+    def _updated_after(self, resource):
+        high_water = self.get_high_water(resource)
+        if high_water is None:
+            return datetime.now(timezone.utc) - timedelta(days=self.backfill_days)
+        return datetime.fromisoformat(high_water.replace('Z', '+00:00')) - self.SYNC_OVERLAP
+
+    def sync_plan(self):
+        """
+        The updated_after filter to send for each resource on the next sync.
+        """
+        plan = {}
+        for resource in RESOURCES:
+            updated_after = self._updated_after(resource)
+            if resource == 'repair_orders':
+                plan[resource] = {'updated_after': updated_after.strftime("%Y-%m-%dT%H:%M:%SZ")}
+            else:
+                plan[resource] = {'updated_after': updated_after}
+        return plan
+
+    def upsert(self, resource, records):
+        columns = RESOURCES[resource]
+        rows = [(record['id'], record.get('updated_at'), *(record.get(column) for column in columns), json.dumps(record))
+                for record in records if record.get('id') is not None]
+        placeholders = ", ".join("?" * (len(columns) + 3))
+        column_names = ", ".join(['id', 'updated_at', *columns, 'data'])
+        with self._lock, self._connect() as connection:
+            connection.executemany(f"INSERT OR REPLACE INTO {resource} ({column_names}) VALUES ({placeholders})", rows)
+            high_water = max((row[1] for row in rows if row[1]), default=None)
+            if high_water:
+                previous = connection.execute("SELECT high_water FROM sync_state WHERE resource = ?", (resource,)).fetchone()
+                if previous is None or previous[0] is None or high_water > previous[0]:
+                    connection.execute("INSERT OR REPLACE INTO sync_state (resource, high_water) VALUES (?, ?)", (resource, high_water))
+        return len(rows)
+
+    def sync(self, api):
+        """
+        Pull every record changed since the last sync through a ShopWareAPI.
+        """
+        plan = self.sync_plan()
+        backfills = {resource for resource in plan if self.get_high_water(resource) is None}
+        fetchers = {
+            'repair_orders': lambda filters: api.get_all_pages(api.get_repair_orders, per_page=100, **filters),
+            'appointments': lambda filters: api.get_all_pages(api.get_appointments, filters['updated_after']),
+            'payments': lambda filters: api.get_all_pages(api.get_payments_of_day, filters['updated_after'])
+        }
+        for resource, filters in plan.items():
+            count = self.upsert(resource, fetchers[resource](filters)['results'])
+            if resource in backfills:
+                self._record_backfill(resource, filters['updated_after'])
+            logger.info(f"Synced {count} {resource} updated after {filters['updated_after']}")
+
+    async def sync_async(self, api):
+        """
+        sync() for an AsyncShopWareAPI; the three resources are fetched concurrently.
+        """
+        plan = self.sync_plan()
+        backfills = {resource for resource in plan if self.get_high_water(resource) is None}
+        responses = await asyncio.gather(
+            api.get_all_pages(api.get_repair_orders, per_page=100, **plan['repair_orders']),
+            api.get_all_pages(api.get_appointments, plan['appointments']['updated_after']),
+            api.get_all_pages(api.get_payments_of_day, plan['payments']['updated_after'])
+        )
+        for resource, response in zip(['repair_orders', 'appointments', 'payments'], responses):
+            count = await asyncio.to_thread(self.upsert, resource, response['results'])
+            if resource in backfills:
+                await asyncio.to_thread(self._record_backfill, resource, plan[resource]['updated_after'])
+            logger.info(f"Synced {count} {resource} updated after {plan[resource]['updated_after']}")
+
+    def _query(self, sql, params=()):
+        with self._connect() as connection:
+            return [json.loads(row[0]) for row in connection.execute(sql, params)]
+
+    @staticmethod
+    def _timestamp(value):
+        # Normalise to ShopWare's 'YYYY-MM-DDTHH:MM:SSZ' so string comparison in SQL is chronological
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc)
+            return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+        value = str(value)
+        return f"{value}T00:00:00Z" if len(value) == 10 else value
+
+    def get_repair_orders_closed_after(self, closed_after):
+        return self._query("SELECT data FROM repair_orders WHERE closed_at >= ? ORDER BY id", (self._timestamp(closed_after),))
+
+    def iter_repair_orders_closed_after(self, closed_after, batch_size=500):
+        """
+        get_repair_orders_closed_after in batches of `batch_size`, read lazily
+        from the cursor. Consume it on a single thread: the SQLite connection
+        belongs to the thread that opened it.
+        """
+        with self._connect() as connection:
+            cursor = connection.execute("SELECT data FROM repair_orders WHERE closed_at >= ? ORDER BY id", (self._timestamp(closed_after),))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield [json.loads(row[0]) for row in rows]
+
+    def get_appointments_updated_after(self, updated_after):
+        return self._query("SELECT data FROM appointments WHERE updated_at > ? ORDER BY id", (self._timestamp(updated_after),))
+
+    def get_payments_updated_after(self, updated_after):
+        return self._query("SELECT data FROM payments WHERE updated_at > ? ORDER BY id", (self._timestamp(updated_after),))
@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class StaffDirectory:
+    """
+    Technician display names by staff ID, persisted to disk between runs.
+
+    The whole staff list is bulk-loaded from the staffs endpoint and reused
+    until it is older than the TTL, so naming technicians is a dict lookup
+    instead of one API call per technician per run. IDs missing from the
+    list (staff added since the last load) are fetched individually and
+    added to it.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.getenv('STAFF_DIRECTORY_PATH', 'data/staff_directory.json')
+        self.ttl = ttl or float(os.getenv('STAFF_DIRECTORY_TTL', 86400))
+        self.names = {}
+        self.loaded_at = None
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def format_name(staff_member):
+        return f"{staff_member['first_name']} {staff_member['last_name']}"
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.names = data.get('names', {})
+            self.loaded_at = data.get('loaded_at')
+            logger.info(f"Loaded staff directory with {len(self.names)} staff members")
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            logger.error(f"Could not load staff directory from {self.path}: {e}")
+
+    def save(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Daily, weekly and on-demand runs save concurrently; each writes its own temporary file
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with self._lock:
+                names = dict(self.names)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'loaded_at': self.loaded_at, 'names': names}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Could not save staff directory to {self.path}: {e}")
+
+    def is_stale(self):
+        return self.loaded_at is None or time.time() - self.loaded_at > self.ttl
+
+    def add(self, staff_member):
+        if staff_member.get('id') is None:
+            return
+        with self._lock:
+            # JSON object keys are strings, so key by str(id) throughout
+            self.names[str(staff_member['id'])] = self.format_name(staff_member)
+
+    def update(self, staff_members, loaded_at):
+        for staff_member in staff_members:
+            self.add(staff_member)
+        self.loaded_at = loaded_at
+        self.save()
+        logger.info(f"Refreshed staff directory with {len(staff_members)} staff members")
+
+    def refresh(self, api):
+        """
+        Reload the full staff list and persist it.
+        """
+        loaded_at = time.time()
+        response = api.get_all_pages(api.get_staffs, per_page=100)
+        self.update(response['results'], loaded_at)
+
+    def lookup(self, staff_id):
+        """
+        Return the display name for an ID, or None when it is not in the directory.
+        """
+        return self.names.get(str(staff_id))
+
+    def resolve(self, staff_ids):
+        """
+        Names for a batch of IDs; unknown ones get an 'Unknown (ID: ...)' placeholder.
+        """
+        return {staff_id: self.lookup(staff_id) or f"Unknown (ID: {staff_id})" for staff_id in staff_ids}
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class TireIndex:
+    """
+    In-memory set of tire inventory IDs, persisted to disk between runs.
+
+    The index is bulk-loaded from the inventories endpoint once and then
+    refreshed incrementally with updated_after, so classifying a part is a
+    set lookup instead of an API call. IDs the index has never seen (items
+    created since the last refresh) are fetched one by one and kept in a
+    small LRU cache with a TTL.
+    """
+
+    def __init__(self, path=None, cache_size=None, cache_ttl=None):
+        self.path = path or os.getenv('TIRE_INDEX_PATH', 'data/tire_index.json')
+        self.cache_size = cache_size or int(os.getenv('TIRE_INDEX_CACHE_SIZE', 1024))
+        self.cache_ttl = cache_ttl or float(os.getenv('TIRE_INDEX_CACHE_TTL', 3600))
+        self.tire_ids = set()
+        self.non_tire_ids = set()
+        self.synced_at = None
+        self._fallback = OrderedDict()
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def classify(inventory_item):
+        return inventory_item.get("part_type", "None") == "Tire" or inventory_item.get("reporting_category", "None") == "Tires"
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.tire_ids = set(data.get('tire_ids', []))
+            self.non_tire_ids = set(data.get('non_tire_ids', []))
+            self.synced_at = data.get('synced_at')
+            logger.info(f"Loaded tire index with {len(self.tire_ids)} tires and {len(self.non_tire_ids)} other items")
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            logger.error(f"Could not load tire index from {self.path}: {e}")
+
+    def save(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Daily, weekly and on-demand runs save concurrently; each writes its own temporary file
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'synced_at': self.synced_at,
+                    'tire_ids': sorted(self.tire_ids),
+                    'non_tire_ids': sorted(self.non_tire_ids)
+                }, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Could not save tire index to {self.path}: {e}")
+
+    def add(self, inventory_item):
+        item_id = inventory_item.get('id')
+        if item_id is None:
+            return
+        if self.classify(inventory_item):
+            self.tire_ids.add(item_id)
+            self.non_tire_ids.discard(item_id)
+        else:
+            self.non_tire_ids.add(item_id)
+            self.tire_ids.discard(item_id)
+
+    def refresh_filters(self):
+        # Everything on the first run, only changed items afterwards
+        return {'updated_after': self.synced_at} if self.synced_at else {}
+
+    def update(self, inventory_items, synced_at):
+        with self._lock:
+            for inventory_item in inventory_items:
+                self.add(inventory_item)
+            self.synced_at = synced_at
+            self._fallback.clear()
+            self.save()
+        logger.info(f"Refreshed tire index with {len(inventory_items)} inventory items")
+
+    def refresh(self, api):
+        """
+        Pull inventory items changed since the last sync (all of them on the
+        first run) and persist the index.
+        """
+        started_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        response = api.get_all_pages(api.get_inventories, per_page=100, **self.refresh_filters())
+        self.update(response['results'], started_at)
+
+    def lookup(self, inventory_item_id):
+        """
+        Return True/False for indexed or cached IDs and None when unknown.
+        """
+        if inventory_item_id in self.tire_ids:
+            return True
+        if inventory_item_id in self.non_tire_ids:
+            return False
+        with self._lock:
+            cached = self._fallback.get(inventory_item_id)
+            if cached is None:
+                return None
+            is_tire, cached_at = cached
+            if time.monotonic() - cached_at > self.cache_ttl:
+                del self._fallback[inventory_item_id]
+                return None
+            self._fallback.move_to_end(inventory_item_id)
+            return is_tire
+
+    def remember(self, inventory_item_id, is_tire):
+        with self._lock:
+            self._fallback[inventory_item_id] = (is_tire, time.monotonic())
+            self._fallback.move_to_end(inventory_item_id)
+            while len(self._fallback) > self.cache_size:
+                self._fallback.popitem(last=False)
@@ -1,39 +1,193 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta, timezone
 import pandas as pd
-import matplotlib.pyplot as plt
+import asyncio
 import base64
-import io
-import seaborn as sns
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from apps.charts import CHART_IMAGE_TYPES, get_shared_chart_renderer, render_chart
+from apps.financials import summarize_closed_sales
+from apps.kpirollup import DailyKpiAccumulator
+from apps.records import parse_repair_orders
+from apps.report import Report
+from utils.metrics import SectionTimer
 
 
 logger = logging.getLogger(__name__)
 
 
 class WeeklyReports:
-    def __init__(self, api,duration):
+    def __init__(self, api,duration, store=None, rollup=None, chart_format=None, chart_dpi=None, chart_budget=None, chart_renderer=None, store_synced=False):
+        """
+        :param chart_format: 'png' for one PNG per chart, 'svg' for compact vector charts
+            (browsers render them, most mail clients do not) or 'panel' for a single
+            multi-panel PNG. Defaults to WEEKLY_CHART_FORMAT, then 'png'
+        :param chart_dpi: Starting PNG resolution, WEEKLY_CHART_DPI or 100
+        :param chart_budget: Encoded bytes all charts of a report may take, WEEKLY_REPORT_MAX_BYTES
+            or 1,000,000; PNG resolution is lowered until the charts fit, 0 turns it off
+        :param chart_renderer: ChartRenderer to draw with, the shared process pool by default
+        :param store_synced: The caller synced the store just before, so the run reads it without syncing again
+        """
         self.api = api
         self.duration = duration
-    def get_next_2_weeks_appointments(self):
+        self.store = store
+        self.rollup = rollup
+        self.store_synced = store_synced
+        self.chart_format = (chart_format or os.getenv('WEEKLY_CHART_FORMAT', 'png')).lower()
+        if self.chart_format not in CHART_IMAGE_TYPES:
+            logger.error(f"Unknown chart format {self.chart_format}, using png")
+            self.chart_format = 'png'
+        self.chart_dpi = chart_dpi or int(os.getenv('WEEKLY_CHART_DPI', 100))
+        self.chart_min_dpi = int(os.getenv('WEEKLY_CHART_MIN_DPI', 50))
+        self.chart_budget = chart_budget if chart_budget is not None else int(os.getenv('WEEKLY_REPORT_MAX_BYTES', 1_000_000))
+        self.chart_renderer = chart_renderer or get_shared_chart_renderer()
+        self.timer = SectionTimer('weekly')
+        self._daily_metrics = {}
+        # False once the store sync fails, so days read from stale data are never rolled up
+        self._snapshot_complete = True
+
+    def _get_appointments(self, updated_after):
+        if self.store is not None:
+            return {'results': self.store.get_appointments_updated_after(updated_after)}
+        return self.api.get_all_pages(self.api.get_appointments, updated_after)
+
+    def sync_store(self):
+        """
+        Bring the local store up to date before reading from it. On failure the
+        report is built from the data as of the last successful sync.
+        """
+        if self.store is None or self.store_synced:
+            return
+        try:
+            self.store.sync(self.api)
+        except Exception as e:
+            self._snapshot_complete = False
+            logger.error(f"Error syncing local store, using data from the last sync: {str(e)}")
+
+    def _reset(self):
+        self._daily_metrics = {}
+        self._snapshot_complete = True
+
+    def _store_covers(self, start_date):
+        """
+        Whether the local store holds every repair order closed since `start_date`;
+        days before its first sync have to be read from the API.
+        """
+        if self.store is None:
+            return False
+        try:
+            covered = self.store.covered_since('repair_orders') <= datetime.combine(start_date, time(), tzinfo=timezone.utc)
+        except Exception as e:
+            logger.error(f"Error reading local store coverage: {str(e)}")
+            return False
+        if not covered:
+            logger.info(f"Repair orders closed since {start_date} predate the local store, fetching them from ShopWare")
+        return covered
+
+    def _iter_repair_order_pages(self, start_date):
+        if self._store_covers(start_date):
+            pages = self.store.iter_repair_orders_closed_after(start_date)
+        else:
+            pages = self.api.iter_pages(self.api.get_repair_orders, per_page=100, closed_after=f"{start_date}T00:00:00Z")
+        for page in pages:
+            yield parse_repair_orders(page)
+
+    async def _aiter_repair_order_pages(self, start_date):
+        if not await asyncio.to_thread(self._store_covers, start_date):
+            async for page in self.api.iter_pages(self.api.get_repair_orders, per_page=100, closed_after=f"{start_date}T00:00:00Z"):
+                yield parse_repair_orders(page)
+            return
+        # The store's cursor must stay on the thread that opened it
+        pages = self.store.iter_repair_orders_closed_after(start_date)
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            try:
+                while (page := await loop.run_in_executor(executor, next, pages, None)) is not None:
+                    yield parse_repair_orders(page)
+            finally:
+                await loop.run_in_executor(executor, pages.close)
+
+    def _report_days(self, num_weeks):
+        today = datetime.now().date()
+        return [today - timedelta(days=i) for i in range(num_weeks * 7 - 1, -1, -1)]
+
+    def _load_rollup(self, days):
+        """
+        Take every day the KPI rollup already has from it and return the days
+        that still need computing from repair orders.
+        """
+        missing = [day for day in days if day not in self._daily_metrics]
+        if self.rollup is not None and missing:
+            try:
+                stored = self.rollup.load(missing)
+            except Exception as e:
+                logger.error(f"Error reading daily KPI rollup, recomputing from repair orders: {str(e)}")
+            else:
+                self._set_daily_metrics(stored)
+                missing = [day for day in missing if day not in self._daily_metrics]
+        return missing
+
+    def _set_daily_metrics(self, kpis):
+        for day in kpis.index:
+            self._daily_metrics[day] = {
+                'closed_sales': summarize_closed_sales(kpis.loc[[day]]),
+                'car_count': int(kpis.at[day, 'car_count']),
+                'billable_hours': kpis.at[day, 'billable_hours']
+            }
+
+    def _prepare_daily_metrics(self, days):
+        """
+        Make sure daily metrics exist for all of `days`: rollup rows first,
+        then one streamed pass over the repair orders (starting a day early
+        so every business timezone's first day is whole) for the rest.
+        Completed days computed here are written back to the rollup.
+        """
+        missing = self._load_rollup(days)
+        if not missing:
+            return
+        start_date = min(missing) - timedelta(days=1)
+        # Aggregate page by page rather than holding the whole window's ROs
+        accumulator = DailyKpiAccumulator(missing, self.api.is_tyre)
+        for page in self._iter_repair_order_pages(start_date):
+            accumulator.add(page)
+        self._finish_daily_metrics(accumulator.kpis(), start_date)
+
+    def _finish_daily_metrics(self, kpis, start_date):
+        self._set_daily_metrics(kpis)
+        if self.rollup is not None and not self._snapshot_complete:
+            logger.error("Not writing daily KPI rollup: the local store could not be synced")
+        elif self.rollup is not None:
+            try:
+                loaded_from = datetime.combine(start_date, time(), tzinfo=timezone.utc)
+                complete_days = set(self.rollup.complete_days(loaded_from))
+                self.rollup.save(kpis[kpis.index.isin(complete_days)])
+            except Exception as e:
+                logger.error(f"Error writing daily KPI rollup: {str(e)}")
+
+    def get_daily_metrics(self, specific_date):
+        """
+        Closed sales, car count and billable hours for one business date,
+        read from the KPI rollup or computed from the repair-order index.
+        """
+        day = specific_date.date() if isinstance(specific_date, datetime) else specific_date
+        self._prepare_daily_metrics([day])
+        return self._daily_metrics[day]
+
+    def get_next_2_weeks_appointments(self, appointments=None):
         today = datetime.now().date()
         end_date = today + timedelta(days=14)  # Look ahead 14 days for 2 weeks
 
         updated_after = today - timedelta(days=30)  # Fetch appointments updated in the last 30 days
 
         appointment_counts = {}
-        page = 1
-        while True:
-            appointments = self.api.get_appointments(updated_after, page=page)
-
-            for appointment in appointments['results']:
-                start_at = datetime.fromisoformat(appointment['start_at'].rstrip('Z')).date()
+        if appointments is None:
+            appointments = self._get_appointments(updated_after)
 
-                if today <= start_at < end_date and start_at.weekday() < 5:
-                    appointment_counts[start_at] = appointment_counts.get(start_at, 0) + 1
+        for appointment in appointments['results']:
+            start_at = datetime.fromisoformat(appointment['start_at'].rstrip('Z')).date()
 
-            if page >= appointments['total_pages']:
-                break
-            page += 1
+            if today <= start_at < end_date and start_at.weekday() < 5:
+                appointment_counts[start_at] = appointment_counts.get(start_at, 0) + 1
 
         return self._create_appointments_dataframe(today, end_date, appointment_counts)
 
@@ -52,90 +206,18 @@ class WeeklyReports:
 
         return pd.DataFrame(data)
 
-    def get_tech_billable_hours_complete(self, specific_date):
-        specific_date = specific_date or (datetime.now() - timedelta(days=3)).date().isoformat()
-        page = 1
-        complete_response = {
-            "results": [],
-            "limit": 100,
-            "limited": False,
-            "total_count": 0,
-            "current_page": 1,
-            "total_pages": 0
-        }
-        try:
-            while True:
-                response = self.api.get_repair_orders(
-                    page=page,
-                    per_page=100,
-                    closed_after=f"{specific_date}T00:00:00Z",
-                    status='invoice'
-                )
-                
-                # For first page, initialize the metadata
-                if page == 1:
-                    complete_response['total_pages'] = response.get('total_pages', 0)
-                    complete_response['total_count'] = response.get('total_count', 0)
-                    
-                # Extend the results list with the current page's results
-                if 'results' in response:
-                    complete_response['results'].extend(response['results'])
-                
-                # Check if we've reached the last page
-                if page >= response.get('total_pages', 0):
-                    break
-                    
-                page += 1
-                
-            # Update final metadata
-            complete_response['current_page'] = 1  # Always 1 since we're combining all pages
-            complete_response['limit'] = len(complete_response['results'])
-            complete_response['limited'] = False  # Since we're getting all results
-                
-            return complete_response
-        
-        except Exception as e:
-            logger.error(f"Error getting Tech Billable hours of the day: {str(e)}")
-            return None
-
-
-    def get_tech_billable_hours(self, repair_orders, specific_date):
-        tech_hours = {}
-        df=pd.DataFrame([[0,0]], columns=['Technician ID', 'Billable Hours'])
-        df = df.sort_values('Billable Hours', ascending=False).reset_index(drop=True)
-        for ro in repair_orders['results']:
-            # print (ro.get('closed_at'))
-            if datetime.strptime(str(ro.get('closed_at')), "%Y-%m-%dT%H:%M:%SZ").date() == datetime.strptime(str(specific_date), "%Y-%m-%d %H:%M:%S").date() :
-                for service in ro.get('services', []):
-                    for labor in service.get('labors', []):
-                        tech_id = labor.get('technician_id')
-                        if labor.get('hours', 0):
-                            hours = labor.get('hours', 0)
-                            if tech_id:
-                                if tech_id not in tech_hours:
-                                    tech_hours[tech_id] = 0
-                                tech_hours[tech_id] += hours
-
-            df = pd.DataFrame([(tech_id, hours) for tech_id, hours in tech_hours.items()],
-                            columns=['Technician ID', 'Billable Hours'])
-            df = df.sort_values('Billable Hours', ascending=False).reset_index(drop=True)
-
-        return df
-
     def get_weekly_tech_billable_hours(self, num_weeks=8):
         today = datetime.now().date()
         # today= today - timedelta(days=3)
         num_weeks=self.duration
-        start_date1=today - timedelta(days=num_weeks * 7)
         end_dates = [today - timedelta(days=i * 7) for i in range(num_weeks)]
         start_dates = [end_date - timedelta(days=6) for end_date in end_dates]
-        response_tech_billable_hours=self.get_tech_billable_hours_complete(start_date1)
+        self._prepare_daily_metrics(self._report_days(num_weeks))
         weekly_data = []
         for start_date, end_date in zip(start_dates[::-1], end_dates[::-1]):
             total_hours=0
             for single_date in pd.date_range(start_date, end_date):
-                df = self.get_tech_billable_hours(response_tech_billable_hours, single_date)
-                total_hours = total_hours + df['Billable Hours'].sum()
+                total_hours = total_hours + self.get_daily_metrics(single_date)['billable_hours']
                 
             weekly_data.append({
                 'Week': f"{start_date.strftime('%m/%d')} - {end_date.strftime('%m/%d')}",
@@ -145,248 +227,6 @@ class WeeklyReports:
         df_weekly = pd.DataFrame(weekly_data)
         return df_weekly
 
-    def get_closed_sales_complete(self, specific_date=None):
-        specific_date = specific_date or (datetime.now() - timedelta(days=3)).date().isoformat()
-        page = 1
-        complete_response = {
-            "results": [],
-            "limit": 100,
-            "limited": False,
-            "total_count": 0,
-            "current_page": 1,
-            "total_pages": 0
-        }
-        
-        try:
-            while True:
-                response = self.api.get_repair_orders(
-                    page=page,
-                    per_page=100,
-                    closed_after=f"{specific_date}T00:00:00Z",
-                    status='invoice'
-                )
-                
-                # For first page, initialize the metadata
-                if page == 1:
-                    complete_response['total_pages'] = response.get('total_pages', 0)
-                    complete_response['total_count'] = response.get('total_count', 0)
-                    
-                # Extend the results list with the current page's results
-                if 'results' in response:
-                    complete_response['results'].extend(response['results'])
-                
-                # Check if we've reached the last page
-                if page >= response.get('total_pages', 0):
-                    break
-                    
-                page += 1
-                
-            # Update final metadata
-            complete_response['current_page'] = 1  # Always 1 since we're combining all pages
-            complete_response['limit'] = len(complete_response['results'])
-            complete_response['limited'] = False  # Since we're getting all results
-                
-            return complete_response
-            
-        except Exception as e:
-            logger.error(f"Error getting closed sales of the day: {str(e)}")
-            return None
-
-
-    def get_closed_sales_of_day(self,response, specific_date=None):
-        # specific_date = specific_date or (datetime.now() - timedelta(days=3)).date().isoformat()
-        total_revenue = 0
-        total_cost = 0
-        closed_ros = []
-
-        try:
-            total_revenue = 0
-            total_cost = 0
-            total_parts_revenue = 0
-            total_parts_cost = 0
-            total_tire_revenue = 0
-            total_tire_cost = 0
-            closed_ros = []
-
-            for ro in response['results']:
-                # print(f"Updated AT {datetime.strptime(str(ro['closed_at']), "%Y-%m-%dT%H:%M:%SZ").date()}")
-                # print(datetime.strptime(str(specific_date), "%Y-%m-%d %H:%M:%S").date())
-                if datetime.strptime(str(ro['closed_at']), "%Y-%m-%dT%H:%M:%SZ").date() == datetime.strptime(str(specific_date), "%Y-%m-%d %H:%M:%S").date() :
-                    ro_revenue, ro_cost, part_revenue, part_cost, tire_revenue, tire_cost = self._calculate_ro_financials(ro)
-                    total_revenue += ro_revenue
-                    total_cost += ro_cost
-                    total_parts_revenue += part_revenue
-                    total_parts_cost += part_cost
-                    total_tire_revenue += tire_revenue
-                    total_tire_cost += tire_cost
-                    closed_ros.append({
-                        'RO Number': ro['number'],
-                        'Revenue': ro_revenue,
-                        'Parts + Tires Cost': part_cost + tire_cost,
-                        'Parts + Tires Margin': (part_revenue + tire_revenue) - (part_cost + tire_cost),
-                        'Parts Margin %': (part_revenue - part_cost) / part_revenue * 100 if part_revenue > 0 else 0,
-                        'Tires Margin %': (tire_revenue - tire_cost) / tire_revenue * 100 if tire_revenue > 0 else 0,
-                        'RO Link':"https://bob-s-automotive-services.shop-ware.com/work_orders/" + str(ro['id'])
-                    })
-
-            part_n_tire_marg = (total_tire_revenue + total_parts_revenue) - (total_parts_cost+total_tire_cost)
-            # print(f"Total Parts Revenue: {total_parts_revenue} and Total Parts Cost : {total_parts_cost}")
-            parts_margin = ((total_parts_revenue - total_parts_cost) / total_parts_revenue * 100) if total_parts_revenue > 0 else 0
-            tire_margin  = ((total_tire_revenue - total_tire_cost) / total_tire_revenue * 100) if total_tire_revenue > 0 else 0
-
-            return {
-            'Total Revenue': total_revenue,
-            'Total Parts + Tires Cost': total_cost,
-            'Total Parts + Tires Margin': part_n_tire_marg,
-            'Total Parts Margin %': parts_margin,
-            'Total Tires Margin %': tire_margin,
-            'Closed ROs': closed_ros
-             }
-        except Exception as e:
-            logger.error(f"Error getting closed sales of the day: {str(e)}")
-            return {
-            'Total Revenue': 0,
-            'Total Parts + Tires Cost': 0,
-            'Total Parts + Tires Margin': 0,
-            'Total Parts Margin %': 0,
-            'Total Tires Margin %': 0,
-            'Closed ROs': 0
-             }  # Return zeros and empty list on error
-
-
-    def _calculate_ro_financials(self, ro):
-        revenue = 0
-        cost = 0
-        part_revenue=0
-        part_cost=0
-        tire_revenue=0
-        tire_cost=0
-        try: 
-            for service in ro.get('services', []):
-                # Labor rate in cents
-                labor_rate_cents = service.get('labor_rate_cents', 0)
-
-                # Parts
-                for part in service.get('parts', []):
-                    quoted_price = part.get('quoted_price_cents', 0)
-                    quantity = part.get('quantity', 0)
-                    cost_cents = part.get('cost_cents', 0)
-
-                    revenue += quoted_price * quantity
-                    cost += cost_cents * quantity
-                    
-                    if not self.api.is_tyre(part['part_inventory_id']):# check for tires
-                        part_revenue+=quoted_price * quantity
-                        part_cost+=cost_cents * quantity
-                    else :                                             # tire calculation
-                        tire_revenue += quoted_price * quantity
-                        tire_cost+=cost_cents * quantity
-
-                # Labor
-                for labor in service.get('labors', []):
-                    if labor.get('hours', 0):
-                        hours = labor.get('hours', 0)
-                        revenue += hours * labor_rate_cents
-                    # Assuming labor cost is 50% of revenue, adjust if you have actual labor cost data
-                        # cost += hours * labor_rate_cents * 0.4
-
-                # Sublet
-                for sublet in service.get('sublets', []):
-                    if sublet.get('price_cents', 0) :
-                        revenue += sublet.get('price_cents', 0)
-                    if sublet.get('cost_cents', 0):
-                        cost += sublet.get('cost_cents', 0)
-
-                # Hazmat and Supply Fees (100% GP)
-                for hazmat in service.get('hazmats', []):
-                    if hazmat.get('fee_cents', 0) and hazmat.get('quantity', 0):
-                        fee = hazmat.get('fee_cents', 0)
-                        quantity = hazmat.get('quantity', 0)
-                        revenue += fee * quantity
-        except KeyError as e:
-            logger.error(f"Key error: {e}. Check if the keys exist in the service data.")
-        except TypeError as e:
-            logger.error(f"Type error: {e}. Check data types for calculations.")
-        except Exception as e:
-            logger.error(f"An unexpected error occurred: {e}")
-            # Add supply fee to revenue
-        try:
-            if ro.get('supply_fee_cents', 0):
-                revenue += ro.get('supply_fee_cents', 0)
-
-            # Apply discounts
-            if ro.get('part_discount_cents', 0):
-                revenue -= float(ro.get('part_discount_cents', 0))
-
-            if ro.get('labor_discount_cents', 0):
-                revenue -= float(ro.get('labor_discount_cents', 0))
-
-        except (KeyError, TypeError, ValueError) as e:
-            logger.error(f"Error processing supply fees or discounts: {e}")
-            
-        return (revenue / 100,
-            cost / 100,
-            part_revenue / 100,
-            part_cost / 100,
-            tire_revenue / 100,
-            tire_cost / 100)  # Convert cents to dollars
-
-    def get_car_count(self,specific_date):
-        specific_date = specific_date or (datetime.now() - timedelta(days=3)).date().isoformat()
-        page = 1
-        complete_response = {
-            "results": [],
-            "limit": 100,
-            "limited": False,
-            "total_count": 0,
-            "current_page": 1,
-            "total_pages": 0
-        }
-        
-        try:
-            while True:
-                response = self.api.get_repair_orders(
-                    page=page,
-                    per_page=100,
-                    closed_after=f"{specific_date}T00:00:00Z",
-                )
-                
-                # For first page, initialize the metadata
-                if page == 1:
-                    complete_response['total_pages'] = response.get('total_pages', 0)
-                    complete_response['total_count'] = response.get('total_count', 0)
-                    
-                # Extend the results list with the current page's results
-                if 'results' in response:
-                    complete_response['results'].extend(response['results'])
-                
-                # Check if we've reached the last page
-                if page >= response.get('total_pages', 0):
-                    break
-                    
-                page += 1
-                
-            # Update final metadata
-            complete_response['current_page'] = 1  # Always 1 since we're combining all pages
-            complete_response['limit'] = len(complete_response['results'])
-            complete_response['limited'] = False  # Since we're getting all results
-            
-            logger.info(f"Got cars in of the day.")
-            
-            return complete_response
-            
-        except Exception as e:
-            logger.error(f"Error getting cars in of the day: {str(e)}")
-            return None
-
-    def get_car_count_specific(self,response,specific_date):
-        count=0
-        for ro in response['results']:
-            if datetime.strptime(str(ro['closed_at']), "%Y-%m-%dT%H:%M:%SZ").date() == datetime.strptime(str(specific_date), "%Y-%m-%d %H:%M:%S").date() :
-                count = count + 1
-        return count
-
-
     def get_avg_ro (self,closed_sales,car_count):
         return closed_sales['Total Revenue']/car_count if car_count > 0 else 0
     
@@ -394,9 +234,7 @@ class WeeklyReports:
     def get_weekly_closed_sales(self, num_weeks=8):
         today = datetime.now().date()
         # today= today - timedelta(days=3)
-        start_date1=today - timedelta(days=16 * 7)
-        response_closed_sales = self.get_closed_sales_complete(start_date1)
-        response_car_count = self.get_car_count(start_date1)
+        self._prepare_daily_metrics(self._report_days(num_weeks))
         end_dates = [today - timedelta(days=i * 7) for i in range(num_weeks)]
         start_dates = [end_date - timedelta(days=6) for end_date in end_dates]
         weekly_data = []
@@ -414,8 +252,9 @@ class WeeklyReports:
             # Retrieve data for the current week
             for single_date in pd.date_range(start_date, end_date):
                 print (f"Single Date {single_date}, Start Date {start_date} , End Date {end_date}")
-                daily_sales_data = self.get_closed_sales_of_day(response_closed_sales,single_date)
-                car_count= self.get_car_count_specific(response_car_count,single_date)
+                daily_metrics = self.get_daily_metrics(single_date)
+                daily_sales_data = daily_metrics['closed_sales']
+                car_count = daily_metrics['car_count']
                 # avg_ro= self.get_avg_ro(daily_sales_data,car_count)
                 total_revenue += daily_sales_data['Total Revenue']
                 if daily_sales_data['Total Parts Margin %'] > 0 :
@@ -433,8 +272,8 @@ class WeeklyReports:
                 print("-" * 40 + "\n")                
                 
 
-            total_parts_margin = total_parts_margin / parts_day_count
-            total_tires_margin = total_tires_margin / tires_day_count
+            total_parts_margin = total_parts_margin / parts_day_count if parts_day_count else 0
+            total_tires_margin = total_tires_margin / tires_day_count if tires_day_count else 0
             print (f"Week {start_date.strftime('%m/%d')} - {end_date.strftime('%m/%d')} , Total Revenue {total_revenue},Total Parts Margin % {total_parts_margin}, Total Tires Margin % {total_tires_margin}, Total Car {total_car_count}")
             weekly_data.append({
                 'Week': f"{start_date.strftime('%m/%d')} - {end_date.strftime('%m/%d')}",
@@ -458,79 +297,161 @@ class WeeklyReports:
         return df_weekly
 
     def generate_html_report(self):
-        appointments_df = self.get_next_2_weeks_appointments()
-        billable_hours_df = self.get_weekly_tech_billable_hours()
-        weekly_closed_sales_df = self.get_weekly_closed_sales(num_weeks=self.duration)
-
-        # Plot Total Revenue over the past 8 weeks
-        revenue_plot = self.generate_plot(
-            weekly_closed_sales_df,
-            x_column='Week',
-            y_column='Total Revenue',
-            title='Total Revenue Over the Past' + str(self.duration)+' Weeks',
-            x_label='Week',
-            y_label='Total Revenue ($)',
-            plot_type='line'
-        )
-
-        # Plot Car Count over the past 8 weeks
-        car_count_plot = self.generate_plot(
-            weekly_closed_sales_df,
-            x_column='Week',
-            y_column='Total Car Count',
-            title='Car Count Over' + str(self.duration)+' Weeks',
-            x_label='Week',
-            y_label='Car Count',
-            plot_type='line'
-        )
-
-        # Plot Avg ROs over the past 8 weeks
-        avg_ro_plot = self.generate_plot(
-            weekly_closed_sales_df,
-            x_column='Week',
-            y_column='Total Avg RO',
-            title='Avg ROs Over' + str(self.duration)+' Weeks',
-            x_label='Week',
-            y_label='Avg ROs',
-            plot_type='line'
-        )
-
-        # Plot Parts Margin % over the past 8 weeks
-        parts_margin_plot = self.generate_plot(
-            weekly_closed_sales_df,
-            x_column='Week',
-            y_column='Total Parts Margin %',
-            title='Total Parts Margin % Over' + str(self.duration)+' Weeks',
-            x_label='Week',
-            y_label='Total Parts Margin %',
-            plot_type='line'
-        )
-
-        # Plot Tires Margin % over the past 8 weeks
-        tires_margin_plot = self.generate_plot(
-            weekly_closed_sales_df,
-            x_column='Week',
-            y_column='Total Tires Margin %',
-            title='Total Tires Margin % ' + str(self.duration)+' Weeks',
-            x_label='Week',
-            y_label='Total Tires Margin %',
-            plot_type='line'
-        )
-
-
-
-        # Plot Tech billable Hours over the past 8 weeks
-        tech_billable_hours_plot = self.generate_plot(
-            data=billable_hours_df,
-            x_column='Week',
-            y_column='Total Hours',
-            title='Weekly Tech Billable Hours (Last' + str(self.duration)+' Weeks)',
-            x_label='Week',
-            y_label='Total Billable Hours',
-            plot_type='bar'
-        )
-
-        html_content = f"""
+        return self.generate_report().inline_html()
+
+    def generate_report(self):
+        """
+        Build the weekly report as a Report: HTML referencing its charts by
+        cid: URLs plus the chart image bytes, ready to be attached to an email.
+        """
+        self._reset()
+        try:
+            with self.timer.section('fetch'):
+                self.sync_store()
+            # Sections fetch what they need as they go, so without a store the API time lands in compute
+            with self.timer.section('compute'):
+                appointments_df = self.get_next_2_weeks_appointments()
+                billable_hours_df = self.get_weekly_tech_billable_hours()
+                weekly_closed_sales_df = self.get_weekly_closed_sales(num_weeks=self.duration)
+
+            with self.timer.section('render'):
+                return self._render_report(appointments_df, billable_hours_df, weekly_closed_sales_df)
+        finally:
+            self.timer.observe()
+
+    async def generate_html_report_async(self):
+        report = await self.generate_report_async()
+        return report.inline_html()
+
+    async def generate_report_async(self):
+        """
+        Same report as generate_report for an AsyncShopWareAPI. The
+        appointments download alongside the streamed repair-order pages on the
+        event loop; plotting and HTML run in a worker thread.
+        """
+        today = datetime.now().date()
+        self._reset()
+        try:
+            with self.timer.section('fetch'):
+                if self.store is not None:
+                    try:
+                        if not self.store_synced:
+                            await self.store.sync_async(self.api)
+                    except Exception as e:
+                        self._snapshot_complete = False
+                        logger.error(f"Error syncing local store, using data from the last sync: {str(e)}")
+                    appointments = asyncio.ensure_future(asyncio.to_thread(self._get_appointments, today - timedelta(days=30)))
+                else:
+                    appointments = asyncio.ensure_future(self.api.get_all_pages(self.api.get_appointments, today - timedelta(days=30)))
+
+                # Only the days the rollup lacks (at least today) need repair orders
+                missing = await asyncio.to_thread(self._load_rollup, self._report_days(self.duration))
+                if missing:
+                    start_date = min(missing) - timedelta(days=1)
+                    accumulator = DailyKpiAccumulator(missing, self.api.is_tyre)
+                    async for page in self._aiter_repair_order_pages(start_date):
+                        await self.api.prime_tyre_index(part.part_inventory_id for ro in page for service in ro.services for part in service.parts)
+                        with self.timer.section('compute'):
+                            await asyncio.to_thread(accumulator.add, page)
+                    with self.timer.section('compute'):
+                        await asyncio.to_thread(self._finish_daily_metrics, accumulator.kpis(), start_date)
+                appointments = await appointments
+
+            def build():
+                with self.timer.section('compute'):
+                    appointments_df = self.get_next_2_weeks_appointments(appointments)
+                    billable_hours_df = self.get_weekly_tech_billable_hours()
+                    weekly_closed_sales_df = self.get_weekly_closed_sales(num_weeks=self.duration)
+                with self.timer.section('render'):
+                    return self._render_report(appointments_df, billable_hours_df, weekly_closed_sales_df)
+
+            return await asyncio.to_thread(build)
+        finally:
+            self.timer.observe()
+
+    def _chart_specs(self, weekly_closed_sales_df, billable_hours_df):
+        weeks = str(self.duration)
+        return {
+            # Plot Total Revenue over the past 8 weeks
+            'revenue': dict(data=weekly_closed_sales_df, x_column='Week', y_column='Total Revenue', title='Total Revenue Over the Past' + weeks + ' Weeks',
+                            x_label='Week', y_label='Total Revenue ($)', plot_type='line'),
+            # Plot Car Count over the past 8 weeks
+            'car_count': dict(data=weekly_closed_sales_df, x_column='Week', y_column='Total Car Count', title='Car Count Over' + weeks + ' Weeks',
+                              x_label='Week', y_label='Car Count', plot_type='line'),
+            # Plot Avg ROs over the past 8 weeks
+            'avg_ro': dict(data=weekly_closed_sales_df, x_column='Week', y_column='Total Avg RO', title='Avg ROs Over' + weeks + ' Weeks',
+                           x_label='Week', y_label='Avg ROs', plot_type='line'),
+            # Plot Parts Margin % over the past 8 weeks
+            'parts_margin': dict(data=weekly_closed_sales_df, x_column='Week', y_column='Total Parts Margin %', title='Total Parts Margin % Over' + weeks + ' Weeks',
+                                 x_label='Week', y_label='Total Parts Margin %', plot_type='line'),
+            # Plot Tires Margin % over the past 8 weeks
+            'tires_margin': dict(data=weekly_closed_sales_df, x_column='Week', y_column='Total Tires Margin %', title='Total Tires Margin % ' + weeks + ' Weeks',
+                                 x_label='Week', y_label='Total Tires Margin %', plot_type='line'),
+            # Plot Tech billable Hours over the past 8 weeks
+            'tech_billable_hours': dict(data=billable_hours_df, x_column='Week', y_column='Total Hours', title='Weekly Tech Billable Hours (Last' + weeks + ' Weeks)',
+                                        x_label='Week', y_label='Total Billable Hours', plot_type='bar')
+        }
+
+    def _render_report(self, appointments_df, billable_hours_df, weekly_closed_sales_df):
+        specs = self._chart_specs(weekly_closed_sales_df, billable_hours_df)
+        image_type = CHART_IMAGE_TYPES[self.chart_format]
+        report = Report()
+
+        if self.chart_format == 'panel':
+            with self.timer.section('plot'):
+                panel = self.chart_renderer.render_panel(list(specs.values()), self.chart_format, self.chart_dpi, self.chart_min_dpi, self.chart_budget)
+            panel_plot = report.add_image(panel, image_type)
+            chart_sections = f"""
+            <h2>Weekly trends over the past {self.duration} weeks</h2>
+            <div class="plot-container">
+                <img src="{panel_plot}" alt="Weekly Trends Over the Past {self.duration} Weeks">
+            </div>
+            <p>Total revenue, car count, average RO, parts and tires margin and technician billable hours for the past {self.duration} weeks.</p>
+"""
+        else:
+            with self.timer.section('plot'):
+                plots = self.chart_renderer.render_charts(specs, self.chart_format, self.chart_dpi, self.chart_min_dpi, self.chart_budget)
+            plots = {name: report.add_image(content, image_type) for name, content in plots.items()}
+            chart_sections = f"""
+            <h2>Total Revenue over the past {self.duration} weeks</h2>
+            <div class="plot-container">
+                <img src="{plots['revenue']}" alt="Total Revenue Over the Past {self.duration} Weeks">
+            </div>
+            <p>This plot shows the total revenue generated over the past {self.duration} weeks, helping to identify trends and patterns in revenue.</p>
+
+            <h2>Car Count over the past {self.duration} weeks</h2>
+            <div class="plot-container">
+                <img src="{plots['car_count']}" alt="Gross Profit Over the Past {self.duration} Weeks">
+            </div>
+            # <p>This plot displays the Car Count for the past {self.duration} weeks, offering insights into profitability trends.</p>
+
+            <h2>Avg ROs over the past {self.duration} weeks</h2>
+            <div class="plot-container">
+                <img src="{plots['avg_ro']}" alt="Gross Profit Over the Past {self.duration} Weeks">
+            </div>
+            # <p>This plot displays the Avg ROs for the past {self.duration} weeks, offering insights into profitability trends.</p>
+
+            <h2>Parts Margin % over the past {self.duration} weeks</h2>
+            <div class="plot-container">
+                <img src="{plots['parts_margin']}" alt="Gross Profit Over the Past {self.duration} Weeks">
+            </div>
+            # <p>This plot displays the Parts Margin % for the past {self.duration} weeks, offering insights into profitability trends.</p>            
+
+            <h2>Tires Margin % over the past {self.duration} weeks</h2>
+            <div class="plot-container">
+                <img src="{plots['tires_margin']}" alt="Gross Profit Over the Past {self.duration} Weeks">
+            </div>
+            # <p>This plot displays the Tires Margin % for the past {self.duration} weeks, offering insights into profitability trends.</p>                        
+            
+            <h2>Weekly Tech Billable Hours</h2>
+            <div class="plot-container">
+                <img src="{plots['tech_billable_hours']}" alt="Weekly Tech Billable Hours">
+            </div>
+            <p>The bar chart represents the total billable hours recorded by technicians over the last {self.duration} weeks.</p>
+
+"""
+
+        report.html = f"""
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -578,49 +499,14 @@ class WeeklyReports:
             <h2>Appointments coming up in next 2 weeks</h2>
             {appointments_df.to_html(index=False)}
 
-            <h2>Total Revenue over the past {self.duration} weeks</h2>
-            <div class="plot-container">
-                <img src="data:image/png;base64,{revenue_plot}" alt="Total Revenue Over the Past {self.duration} Weeks">
-            </div>
-            <p>This plot shows the total revenue generated over the past {self.duration} weeks, helping to identify trends and patterns in revenue.</p>
-
-            <h2>Car Count over the past {self.duration} weeks</h2>
-            <div class="plot-container">
-                <img src="data:image/png;base64,{car_count_plot}" alt="Gross Profit Over the Past {self.duration} Weeks">
-            </div>
-            # <p>This plot displays the Car Count for the past {self.duration} weeks, offering insights into profitability trends.</p>
-
-            <h2>Avg ROs over the past {self.duration} weeks</h2>
-            <div class="plot-container">
-                <img src="data:image/png;base64,{avg_ro_plot}" alt="Gross Profit Over the Past {self.duration} Weeks">
-            </div>
-            # <p>This plot displays the Avg ROs for the past {self.duration} weeks, offering insights into profitability trends.</p>
-
-            <h2>Parts Margin % over the past {self.duration} weeks</h2>
-            <div class="plot-container">
-                <img src="data:image/png;base64,{parts_margin_plot}" alt="Gross Profit Over the Past {self.duration} Weeks">
-            </div>
-            # <p>This plot displays the Parts Margin % for the past {self.duration} weeks, offering insights into profitability trends.</p>            
-
-            <h2>Tires Margin % over the past {self.duration} weeks</h2>
-            <div class="plot-container">
-                <img src="data:image/png;base64,{tires_margin_plot}" alt="Gross Profit Over the Past {self.duration} Weeks">
-            </div>
-            # <p>This plot displays the Tires Margin % for the past {self.duration} weeks, offering insights into profitability trends.</p>                        
-            
-            <h2>Weekly Tech Billable Hours</h2>
-            <div class="plot-container">
-                <img src="data:image/png;base64,{tech_billable_hours_plot}" alt="Weekly Tech Billable Hours">
-            </div>
-            <p>The bar chart represents the total billable hours recorded by technicians over the last {self.duration} weeks.</p>
-
+            {chart_sections}
         </body>
         </html>
         """
 
-        return html_content
+        return report
 
-    def generate_plot(self, data, x_column, y_column, title, x_label, y_label, plot_type='bar', figsize=(12, 6)):
+    def generate_plot(self, data, x_column, y_column, title, x_label, y_label, plot_type='bar', figsize=(12, 6), budget=None):
         """
         Generate a plot based on the given data and parameters.
 
@@ -632,42 +518,15 @@ class WeeklyReports:
         :param y_label: Label for y-axis
         :param plot_type: Type of plot ('bar' or 'line')
         :param figsize: Size of the figure as a tuple (width, height)
-        :return: Base64 encoded string of the plot image
+        :param budget: Largest encoded size in bytes; PNG resolution is lowered to fit
+        :return: Base64 encoded string of the plot image, in the format set by chart_format
         """
-        # Set the style
-        sns.set(style="whitegrid")
-
-        plt.figure(figsize=figsize)
-
-        # Plot based on the specified type
-        if plot_type == 'bar':
-            sns.barplot(x=data[x_column], y=data[y_column], palette='coolwarm')
-        elif plot_type == 'line':
-            sns.lineplot(x=data[x_column], y=data[y_column], marker='o', color='b')
-        else:
-            raise ValueError("Unsupported plot type. Use 'bar' or 'line'.")
-
-        # Enhance plot aesthetics
-        plt.title(title, fontsize=16, fontweight='bold')
-        plt.xlabel(x_label, fontsize=14)
-        plt.ylabel(y_label, fontsize=14)
-        plt.xticks(rotation=45, ha='right')
-        plt.yticks(fontsize=12)
-        plt.grid(True, linestyle='--', alpha=0.6)
-
-        # Optimize layout
-        plt.tight_layout()
-
-        # Save the plot to a base64 encoded string
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=300)  # Higher DPI for better resolution
-        buffer.seek(0)
-        plot_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-
-        return plot_base64
+        spec = dict(data=data, x_column=x_column, y_column=y_column, title=title, x_label=x_label, y_label=y_label, plot_type=plot_type)
+        return base64.b64encode(render_chart(spec, self.chart_format, self.chart_dpi, self.chart_min_dpi, budget, figsize)).decode()
 
     def save_html_report(self, html_content, filename='weekly_appointment_report.html'):
+        if isinstance(html_content, Report):
+            html_content = html_content.inline_html()
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(html_content)
         print(f"HTML report saved as {filename}")
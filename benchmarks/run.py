@@ -0,0 +1,149 @@
+"""
+Time the report pipelines against a synthetic ShopWare tenant.
+
+    python -m benchmarks.run --ros 1000 10000 100000 --parts-per-service 3 --output bench.json
+
+Each scale runs every stage once and reports wall time, peak traced memory
+and ShopWare call counts; results are printed and, with --output, written
+as JSON so runs before and after a change can be compared.
+"""
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from apps.charts import ChartRenderer
+from apps.dailyreports import DailyReports
+from apps.financials import compute_ro_financials
+from apps.ratelimiter import RateLimiter
+from apps.records import parse_repair_orders
+from apps.rendercache import RenderCache
+from apps.shopwareapi import ShopWareAPI
+from apps.staffdirectory import StaffDirectory
+from apps.tireindex import TireIndex
+from apps.weeklyreports import WeeklyReports
+from benchmarks.synthetic import SyntheticAdapter, SyntheticShopWare
+from utils.utils import create_email_with_images, create_email_with_report
+
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.track_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            # The report code prints progress; keep it out of the benchmark output
+            with redirect_stdout(io.StringIO()):
+                yield
+        finally:
+            result = {'wall_s': round(time.perf_counter() - started, 4)}
+            if self.track_memory:
+                result['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+                tracemalloc.stop()
+            self.stages[name] = result
+            logger.info(f"{name}: {result}")
+
+
+def run_benchmark(num_ros, services_per_ro=2, parts_per_service=3, weeks=8, track_memory=True, seed=0):
+    """
+    Run every pipeline stage once at one scale and return the results dict.
+    """
+    shop = SyntheticShopWare(num_ros, services_per_ro, parts_per_service, days=weeks * 7, seed=seed)
+    workdir = tempfile.mkdtemp(prefix='shopware-bench-')
+    api = ShopWareAPI(
+        'https://synthetic.shop-ware.invalid',
+        tire_index=TireIndex(os.path.join(workdir, 'tire_index.json')),
+        staff_directory=StaffDirectory(os.path.join(workdir, 'staff_directory.json')),
+        rate_limiter=RateLimiter(rate=1e9, burst=1e9)
+    )
+    api.session.mount('https://', SyntheticAdapter(shop))
+    timer = StageTimer(track_memory)
+    start_date = datetime.now().date() - timedelta(days=weeks * 7)
+
+    with timer.stage('fetch'):
+        repair_orders = parse_repair_orders(api.get_all_pages(api.get_repair_orders, per_page=100, closed_after=f"{start_date}T00:00:00Z")['results'])
+    with timer.stage('tire_index'):
+        api._ensure_tire_index()
+    with timer.stage('financials'):
+        compute_ro_financials([ro for ro in repair_orders if ro.status == 'invoice'], api.is_tyre)
+
+    # A fresh render cache so the weekly HTML stage times actual rendering
+    weekly = WeeklyReports(api, weeks, chart_renderer=ChartRenderer(cache=RenderCache(os.path.join(workdir, 'render_cache'))))
+    # Like production, the weekly trends stream repair-order pages into the KPI accumulator
+    with timer.stage('weekly_aggregation'):
+        weekly_closed_sales_df = weekly.get_weekly_closed_sales(weeks)
+        billable_hours_df = weekly.get_weekly_tech_billable_hours()
+    with timer.stage('generate_plot'):
+        weekly.generate_plot(weekly_closed_sales_df, 'Week', 'Total Revenue', 'Total Revenue', 'Week', 'Total Revenue ($)', plot_type='line')
+    appointments_df = weekly.get_next_2_weeks_appointments()
+    with timer.stage('weekly_html'):
+        weekly_report = weekly._render_report(appointments_df, billable_hours_df, weekly_closed_sales_df)
+    weekly_html = weekly_report.inline_html()
+    with timer.stage('email_from_html'):
+        create_email_with_images(MIMEMultipart('alternative'), weekly_html).as_bytes()
+    with timer.stage('email_from_report'):
+        create_email_with_report(MIMEMultipart('alternative'), weekly_report).as_bytes()
+    with timer.stage('daily_report'):
+        daily_html = DailyReports(api).generate_html_report()
+    api.close()
+
+    return {
+        'params': {'num_ros': num_ros, 'services_per_ro': services_per_ro, 'parts_per_service': parts_per_service,
+                   'weeks': weeks, 'seed': seed, 'track_memory': track_memory},
+        'repair_orders_fetched': len(repair_orders),
+        'stages': timer.stages,
+        'total_wall_s': round(sum(stage['wall_s'] for stage in timer.stages.values()), 4),
+        'api_calls': dict(shop.calls),
+        'weekly_html_bytes': len(weekly_html),
+        'daily_html_bytes': len(daily_html or '')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ros', type=int, nargs='+', default=[1000, 10000], help='Repair-order counts to benchmark')
+    parser.add_argument('--services-per-ro', type=int, default=2)
+    parser.add_argument('--parts-per-service', type=int, nargs='+', default=[3], help='Mean parts per service; several values sweep it')
+    parser.add_argument('--weeks', type=int, default=8, help='Weekly report window (WEEKLY_DATA)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc, which slows every stage down')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+    runs = []
+    for num_ros in args.ros:
+        for parts_per_service in args.parts_per_service:
+            logger.info(f"Benchmarking {num_ros} ROs with {parts_per_service} parts per service")
+            runs.append(run_benchmark(num_ros, args.services_per_ro, parts_per_service, args.weeks, not args.no_memory, args.seed))
+
+    results = {
+        'started_at': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlsplit
+import json
+import math
+import random
+import re
+import threading
+import requests
+from requests.adapters import BaseAdapter
+
+
+def iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_timestamp(value):
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class SyntheticShopWare:
+    """
+    Deterministic fake ShopWare tenant that scales to millions of ROs.
+
+    Repair orders are never held in memory: RO i is generated on demand from
+    its own seed and closes at a time that grows with i, so closed_after and
+    updated_after filters map to an index range and any page can be built
+    directly. Appointments, payments, inventory and staff are small enough
+    to generate up front.
+    """
+
+    def __init__(self, num_ros=1000, services_per_ro=2, parts_per_service=3, days=56,
+                 num_inventory=5000, num_staff=12, seed=0, now=None):
+        self.num_ros = num_ros
+        self.services_per_ro = services_per_ro
+        self.parts_per_service = parts_per_service
+        self.num_inventory = num_inventory
+        self.num_staff = num_staff
+        self.seed = seed
+        self.now = now or datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.span = timedelta(days=days)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+        rng = random.Random(seed)
+        self.inventory = [{
+            'id': item_id,
+            'part_type': 'Tire' if item_id % 7 == 0 else 'Part',
+            'reporting_category': 'Tires' if item_id % 7 == 0 else 'Parts',
+            'updated_at': iso(self.now - timedelta(days=item_id % 90))
+        } for item_id in range(1, num_inventory + 1)]
+        self.staff = [{'id': staff_id, 'first_name': f"Tech{staff_id}", 'last_name': 'Synthetic'}
+                      for staff_id in range(1, num_staff + 1)]
+        num_appointments = max(100, num_ros // 10)
+        self.appointments = [{
+            'id': appointment_id,
+            'start_at': iso(self.now + timedelta(hours=rng.randint(-5 * 24, 20 * 24))),
+            'updated_at': iso(self.now - timedelta(hours=rng.randint(0, 20 * 24)))
+        } for appointment_id in range(1, num_appointments + 1)]
+        num_payments = max(20, num_ros // max(1, days))
+        self.payments = [{
+            'id': payment_id,
+            'repair_order_id': payment_id,
+            'payment_type': rng.choice(['card', 'cash', 'check']),
+            'amount_cents': rng.randint(2000, 200000),
+            'updated_at': iso(self.now - timedelta(minutes=rng.randint(0, 2 * 24 * 60)))
+        } for payment_id in range(1, num_payments + 1)]
+
+    def closed_at(self, index):
+        return self.now - self.span * (self.num_ros - index) / self.num_ros
+
+    def first_index_after(self, moment):
+        # Smallest i whose closed_at is at or after `moment`
+        elapsed = (self.now - moment) / self.span
+        return min(self.num_ros, max(0, math.ceil(self.num_ros - elapsed * self.num_ros)))
+
+    def repair_order(self, index):
+        rng = random.Random(self.seed * 1_000_003 + index)
+        closed_at = self.closed_at(index)
+        services = []
+        for service_number in range(max(1, round(rng.gauss(self.services_per_ro, 1)))):
+            services.append({
+                'title': f"Service {service_number}",
+                'labor_rate_cents': 15000,
+                'parts': [{
+                    'part_inventory_id': rng.randint(1, self.num_inventory),
+                    'quoted_price_cents': rng.randint(1000, 40000),
+                    'cost_cents': rng.randint(500, 25000),
+                    'quantity': rng.randint(1, 4),
+                    'number': f"P{index}-{service_number}-{part_number}",
+                    'description': 'Synthetic part'
+                } for part_number in range(max(0, round(rng.gauss(self.parts_per_service, 1))))],
+                'labors': [{'hours': rng.choice([0, 0.5, 1, 1.5, 2.5]), 'technician_id': rng.randint(1, self.num_staff)}
+                           for _ in range(rng.randint(0, 2))],
+                'sublets': [{'price_cents': 5000, 'cost_cents': 3000}] if rng.random() < 0.1 else [],
+                'hazmats': [{'fee_cents': 300, 'quantity': 1}] if rng.random() < 0.3 else []
+            })
+        return {
+            'id': index + 1,
+            'number': 100000 + index,
+            'status': 'invoice' if rng.random() < 0.85 else 'estimate',
+            'closed_at': iso(closed_at),
+            'updated_at': iso(closed_at + timedelta(minutes=5)),
+            'supply_fee_cents': rng.choice([0, 500]),
+            'part_discount_cents': rng.choice([0, 0, 1000]),
+            'labor_discount_cents': 0,
+            'services': services
+        }
+
+    @staticmethod
+    def _page(items, params, total_count=None):
+        page = int(params.get('page', 1))
+        per_page = int(params.get('per_page', 100))
+        total_count = len(items) if total_count is None else total_count
+        return {
+            'results': items,
+            'limit': per_page,
+            'limited': False,
+            'total_count': total_count,
+            'current_page': page,
+            'total_pages': max(1, math.ceil(total_count / per_page))
+        }
+
+    @staticmethod
+    def _slice(items, params):
+        page = int(params.get('page', 1))
+        per_page = int(params.get('per_page', 100))
+        return items[(page - 1) * per_page:page * per_page]
+
+    def _updated_after(self, items, params):
+        if 'updated_after' not in params:
+            return items
+        updated_after = parse_timestamp(params['updated_after'])
+        return [item for item in items if parse_timestamp(item['updated_at']) > updated_after]
+
+    def handle(self, path, params):
+        """
+        Answer one API request. Returns (status code, JSON body).
+        """
+        resource = re.sub(r'^.*/api/v1/tenants/[^/]+/', '', path)
+        with self._lock:
+            self.calls[resource.split('/')[0]] += 1
+
+        if resource == 'repair_orders':
+            first = 0
+            if 'closed_after' in params:
+                first = max(first, self.first_index_after(parse_timestamp(params['closed_after'])))
+            if 'updated_after' in params:
+                first = max(first, self.first_index_after(parse_timestamp(params['updated_after']) - timedelta(minutes=5)))
+            page = int(params.get('page', 1))
+            per_page = int(params.get('per_page', 100))
+            start = first + (page - 1) * per_page
+            indexes = range(start, min(self.num_ros, start + per_page))
+            return 200, self._page([self.repair_order(index) for index in indexes], params, self.num_ros - first)
+        if resource in ('appointments', 'payments', 'inventories', 'staffs'):
+            items = {'appointments': self.appointments, 'payments': self.payments,
+                     'inventories': self.inventory, 'staffs': self.staff}[resource]
+            items = self._updated_after(items, params)
+            return 200, self._page(self._slice(items, params), params, len(items))
+        if resource.startswith('inventories/'):
+            item_id = int(resource.split('/')[1])
+            return (200, self.inventory[item_id - 1]) if 1 <= item_id <= self.num_inventory else (404, {})
+        if resource.startswith('staffs/'):
+            staff_id = int(resource.split('/')[1])
+            return (200, self.staff[staff_id - 1]) if 1 <= staff_id <= self.num_staff else (404, {})
+        if resource == 'categories':
+            return 200, {'results': [{'id': 1, 'text': 'General'}]}
+        return 404, {}
+
+
+class SyntheticAdapter(BaseAdapter):
+    """
+    requests adapter answering from a SyntheticShopWare. Bodies still go
+    through JSON encoding and decoding so fetch timings include that cost.
+    """
+
+    def __init__(self, shop):
+        super().__init__()
+        self.shop = shop
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        status, body = self.shop.handle(parts.path, dict(parse_qsl(parts.query)))
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode('utf-8')
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
@@ -1,13 +1,20 @@
 import logging
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, Response
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+import asyncio
+import importlib
 import os
-import requests
-from datetime import datetime
-from apps.shopwareapi import ShopWareAPI
-from apps.dailyreports import DailyReports
-from apps.weeklyreports import WeeklyReports
+import sys
+import threading
+import time
+from datetime import date as date_type, datetime
+from typing import Optional
+from utils.jobs import ReportJobs
+from utils.mailer import get_shared_mailer
+from utils.metrics import latest, time_until_done
+from utils.ondemand import OnDemandReports
 from utils.utils import send_email
 from dotenv import load_dotenv
 import pytz
@@ -25,38 +32,182 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# With a local store, on-demand weekly reports may go back as far as it keeps repair orders;
+# without one they are read straight from the API, which has no such limit
+MAX_WEEKLY_DURATION = (max(1, int(os.getenv('SHOPWARE_STORE_BACKFILL_DAYS', 180)) // 7)
+                       if os.getenv('SHOPWARE_STORE_PATH') else 366)
+
+# Report jobs run on their own worker threads and event loops, one instance per job
+report_jobs = ReportJobs()
+
 # Initialize the scheduler
-scheduler = AsyncIOScheduler()
+scheduler = AsyncIOScheduler(executors=report_jobs.executors(), job_defaults=report_jobs.job_defaults())
+report_jobs.listen(scheduler)
 
-async def generate_daily_shopware_reports():
-    logger.info("Starting daily ShopWare report generation")
-    api = ShopWareAPI(
-        base_url='https://api.shop-ware.com',
+# Reports requested through /reports/*, cached and built one at a time
+on_demand_reports = OnDemandReports()
+
+# The report stack (pandas, matplotlib, seaborn) is imported by the first job, or
+# in the background at startup with PREWARM_REPORTS, so the app starts light
+REPORT_MODULES = ['apps.asyncshopwareapi', 'apps.dailyreports', 'apps.weeklyreports', 'apps.charts', 'apps.rendercache']
+# Local mirror of ShopWare data, synced incrementally on each run (opt-in)
+store = None
+# Per-day KPI totals written by the daily job and read by the weekly trends
+rollup = None
+report_stack_loaded = False
+report_stack_lock = threading.Lock()
+
+def load_report_stack():
+    """
+    Import the report modules and open the store and rollup, once per process.
+    Blocking; call it through asyncio.to_thread from the event loop.
+    """
+    global store, rollup, report_stack_loaded
+    with report_stack_lock:
+        if report_stack_loaded:
+            return
+        started = time.perf_counter()
+        modules = len(sys.modules)
+        for module in REPORT_MODULES:
+            importlib.import_module(module)
+        from apps.kpirollup import DailyKpiRollup
+        from apps.shopwarestore import ShopWareStore
+        store = ShopWareStore() if os.getenv('SHOPWARE_STORE_PATH') else None
+        rollup = DailyKpiRollup()
+        report_stack_loaded = True
+        logger.info(f"Loaded report stack ({len(sys.modules) - modules} modules) in {time.perf_counter() - started:.2f}s")
+
+def shopware_api():
+    from apps.asyncshopwareapi import AsyncShopWareAPI
+    return AsyncShopWareAPI(
+        base_url=os.getenv('SHOPWARE_BASE_URL', 'https://api.shop-ware.com'),
     )
 
-    daily_reports = DailyReports(api)
+async def build_daily_report(store_synced=False):
+    """
+    Fetch and render the daily report.
+
+    :param store_synced: The store was synced just before, so the report need not sync it again
+
+    :return: (DailyReports, HTML), with the HTML None if the report could not be built
+    """
+    await asyncio.to_thread(load_report_stack)
+    import httpx
+    import requests
+    from apps.dailyreports import DailyReports
+    api = shopware_api()
+
+    daily_reports = DailyReports(api, store, rollup, store_synced=store_synced)
     try:
-        daily_html = daily_reports.generate_html_report()
-        daily_reports.save_html_report(daily_html)
-        send_email("Shop Ware Daily Report", daily_html)
-        logger.info("Daily ShopWare report generated and sent successfully")
-    except requests.exceptions.RequestException as e:
+        return daily_reports, await daily_reports.generate_html_report_async()
+    except (requests.exceptions.RequestException, httpx.HTTPError) as e:
         logger.error(f"Failed to generate daily report: {e}", exc_info=True)
+        return daily_reports, None
+    finally:
+        logger.info(f"ShopWare rate limiter: {api.rate_limiter.stats()}")
+        await api.close()
+
+async def build_weekly_report(duration, store_synced=False):
+    """
+    Fetch and render the weekly report covering the last `duration` weeks.
+
+    :param store_synced: The store was synced just before, so the report need not sync it again
+
+    :return: (WeeklyReports, Report), with the Report None if it could not be built
+    """
+    await asyncio.to_thread(load_report_stack)
+    import httpx
+    import requests
+    from apps.rendercache import get_shared_render_cache
+    from apps.weeklyreports import WeeklyReports
+    api = shopware_api()
+
+    weekly_reports = WeeklyReports(api, duration, store, rollup, store_synced=store_synced)
+    try:
+        return weekly_reports, await weekly_reports.generate_report_async()
+    except (requests.exceptions.RequestException, httpx.HTTPError) as e:
+        logger.error(f"Failed to generate weekly report: {e}", exc_info=True)
+        return weekly_reports, None
+    finally:
+        logger.info(f"ShopWare rate limiter: {api.rate_limiter.stats()}")
+        logger.info(f"Render cache: {get_shared_render_cache().stats()}")
+        await api.close()
+
+async def generate_daily_shopware_reports():
+    logger.info("Starting daily ShopWare report generation")
+    daily_reports, daily_html = await build_daily_report()
+    if daily_html is None:
+        return
+    await asyncio.to_thread(daily_reports.save_html_report, daily_html)
+    # Delivery happens on the mailer's queue; the job is done once the email is queued,
+    # and the email section is recorded when the mailer has delivered it
+    time_until_done('daily', 'email', lambda: send_email("Shop Ware Daily Report", daily_html))
+    logger.info("Daily ShopWare report generated and queued for sending")
 
 async def generate_weekly_shopware_reports():
     logger.info("Starting weekly ShopWare report generation")
-    api = ShopWareAPI(
-        base_url='https://api.shop-ware.com',
-    )
+    weekly_reports, weekly_report = await build_weekly_report(int(os.getenv('WEEKLY_DATA')))
+    if weekly_report is None:
+        return
+    await asyncio.to_thread(weekly_reports.save_html_report, weekly_report)
+    time_until_done('weekly', 'email', lambda: send_email("Shop Ware Weekly Report", weekly_report, True))
+    logger.info("Weekly ShopWare report generated and queued for sending")
 
-    weekly_reports = WeeklyReports(api,int(os.getenv('WEEKLY_DATA')))
+async def in_worker_loop(coroutine_function, *args):
+    # Like the scheduled jobs, on-demand reports run on their own event loop in a
+    # worker thread so a long build never stalls other requests
+    return await asyncio.to_thread(lambda: asyncio.run(coroutine_function(*args)))
+
+async def store_version():
+    """
+    Sync the local store and return its high-water marks, which change only
+    when ShopWare data does. None without a store.
+    """
+    if os.getenv('SHOPWARE_STORE_PATH') is None:
+        return None
+    await asyncio.to_thread(load_report_stack)
+    from apps.shopwarestore import RESOURCES
+    api = shopware_api()
     try:
-        weekly_html = weekly_reports.generate_html_report()
-        weekly_reports.save_html_report(weekly_html)
-        send_email("Shop Ware Weekly Report", weekly_html, True)
-        logger.info("Weekly ShopWare report generated and sent successfully")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to generate weekly report: {e}", exc_info=True)
+        await store.sync_async(api)
+    except Exception as e:
+        logger.error(f"Could not sync the local store: {e}")
+        return None
+    finally:
+        await api.close()
+    return tuple(store.get_high_water(resource) for resource in RESOURCES)
+
+# A version means store_version() has just synced the store; without one the build syncs it itself
+async def on_demand_daily(version):
+    _, daily_html = await build_daily_report(store_synced=version is not None)
+    return daily_html
+
+async def on_demand_weekly(duration, version):
+    _, weekly_report = await build_weekly_report(duration, store_synced=version is not None)
+    return weekly_report.inline_html() if weekly_report is not None else None
+
+def report_date(requested):
+    """
+    Reports are built from live ShopWare data as of today, so only today's
+    can be built on demand; an earlier date is served only while it is still cached.
+    """
+    today = datetime.now().date()
+    if requested is None or requested == today:
+        return today, True
+    if requested > today:
+        raise HTTPException(status_code=400, detail="date cannot be in the future")
+    return requested, False
+
+async def serve_report(key, build_today, build):
+    if not build_today:
+        html = on_demand_reports.peek(key)
+        if html is None:
+            raise HTTPException(status_code=404, detail=f"No cached report for {key[1]}; only today's report can be built on demand")
+        return HTMLResponse(html)
+    html = await on_demand_reports.get(key, build, lambda: in_worker_loop(store_version))
+    if html is None:
+        raise HTTPException(status_code=503, detail="The report could not be generated, try again later")
+    return HTMLResponse(html)
 
 @app.on_event("startup")
 async def startup_event():
@@ -64,23 +215,34 @@ async def startup_event():
     # EST Zone
     est = pytz.timezone("America/New_York")
     # Schedule daily report
-    scheduler.add_job(generate_daily_shopware_reports, CronTrigger(hour=20, minute=0, day_of_week='mon-fri',timezone=est))
+    report_jobs.add_job(scheduler, 'daily_report', generate_daily_shopware_reports, CronTrigger(hour=20, minute=0, day_of_week='mon-fri',timezone=est))
     # scheduler.add_job(generate_daily_shopware_reports, CronTrigger())
     logger.info("Scheduled daily report to run at 8 PM EST, Monday to Friday")
     
     # Schedule weekly report
-    scheduler.add_job(generate_weekly_shopware_reports, CronTrigger(day_of_week=6, hour=1, minute=0,timezone=est))
+    report_jobs.add_job(scheduler, 'weekly_report', generate_weekly_shopware_reports, CronTrigger(day_of_week=6, hour=1, minute=0,timezone=est))
     # scheduler.add_job(generate_weekly_shopware_reports, CronTrigger())
     logger.info("Scheduled weekly report to run at 1:00 AM every Sunday")
     
     scheduler.start()
-    logger.info("Scheduler started")  
+    logger.info("Scheduler started")
+
+    if os.getenv('PREWARM_REPORTS', 'false').lower() == 'true':
+        # Load in the background so the app answers health checks meanwhile
+        asyncio.get_running_loop().run_in_executor(None, load_report_stack)  
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down the application")
-    scheduler.shutdown()
-    logger.info("Scheduler shut down")
+    # Don't block the event loop on a report in progress; its thread finishes before the process exits
+    scheduler.shutdown(wait=False)
+    logger.info(f"Scheduler shut down, report jobs: {report_jobs.stats()}")
+    # Only close the chart workers if a weekly run ever started them
+    if 'apps.charts' in sys.modules:
+        sys.modules['apps.charts'].get_shared_chart_renderer().close()
+    # Deliver anything still queued before the process exits
+    await asyncio.to_thread(get_shared_mailer().close, 60)
+    logger.info(f"Mailer: {get_shared_mailer().stats()}")
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
@@ -95,6 +257,26 @@ async def root():
     logger.info("Root endpoint accessed")
     return {"message": "ShopWare Reports Scheduler is running"}
 
+@app.get("/jobs")
+async def jobs():
+    return {**report_jobs.stats(), 'on_demand': on_demand_reports.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    content, content_type = latest()
+    return Response(content, media_type=content_type)
+
+@app.get("/reports/daily", response_class=HTMLResponse)
+async def daily_report(date: Optional[date_type] = None):
+    day, build_today = report_date(date)
+    return await serve_report(('daily', day), build_today, lambda version: in_worker_loop(on_demand_daily, version))
+
+@app.get("/reports/weekly", response_class=HTMLResponse)
+async def weekly_report(date: Optional[date_type] = None, duration: Optional[int] = Query(None, ge=1, le=MAX_WEEKLY_DURATION)):
+    day, build_today = report_date(date)
+    duration = duration or int(os.getenv('WEEKLY_DATA'))
+    return await serve_report(('weekly', day, duration), build_today, lambda version: in_worker_loop(on_demand_weekly, duration, version))
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting the application")
@@ -0,0 +1,54 @@
+"""
+Measure how long importing a module takes and which of its imports cost the most.
+
+    python -m utils.importtime main apps.weeklyreports --top 15
+
+Each target is imported in a fresh interpreter with -X importtime, so the
+numbers match a cold start. Cumulative times include everything a module
+pulls in; peak RSS is the interpreter's memory once the import finishes.
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def measure(module):
+    """
+    Import `module` in a child interpreter.
+
+    :return: (list of (cumulative_us, self_us, depth, name) for every module it loaded, peak RSS in MB)
+    """
+    code = f"import resource, {module}; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    timings = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            timings.append((int(match.group(2)), int(match.group(1)), (len(match.group(3)) - 1) // 2, match.group(4)))
+    return timings, int(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('modules', nargs='+', help='Modules to import, e.g. main')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list per module')
+    args = parser.parse_args()
+
+    for module in args.modules:
+        timings, rss_mb = measure(module)
+        total = next((cumulative for cumulative, _, _, name in timings if name == module), 0)
+        print(f"{module}: {total / 1e6:.2f}s, {len(timings)} modules, peak RSS {rss_mb} MB")
+        # Top-level packages only, so a slow package is not listed once per submodule
+        packages = [timing for timing in timings if timing[2] <= 1 and timing[3] != module]
+        for cumulative, self_us, _, name in sorted(packages, reverse=True)[:args.top]:
+            print(f"  {cumulative / 1e3:9.1f} ms  (self {self_us / 1e3:7.1f} ms)  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+from collections import Counter
+import asyncio
+import os
+import threading
+import time
+from apscheduler.events import (EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED,
+                                EVENT_JOB_SUBMITTED)
+from apscheduler.executors.pool import ThreadPoolExecutor
+from utils.metrics import REPORT_JOB_QUEUE_DEPTH
+
+
+class ReportJobs:
+    """
+    Runs the async report jobs on worker threads, each on its own event loop,
+    and keeps per-job counts.
+
+    The web app's event loop only schedules; a long weekly run never blocks
+    requests or the daily run, and chart rendering still fans out to the
+    chart process pool. Pair it with the scheduler settings from
+    job_defaults(): one instance per job, missed runs coalesced into one and
+    a grace period so a run delayed by a busy host still happens.
+    """
+
+    EXECUTOR = 'reports'
+
+    def __init__(self, workers=None, max_instances=None, misfire_grace_time=None):
+        self.workers = workers or int(os.getenv('REPORT_WORKERS', 2))
+        self.max_instances = max_instances or int(os.getenv('REPORT_MAX_INSTANCES', 1))
+        self.misfire_grace_time = misfire_grace_time or int(os.getenv('REPORT_MISFIRE_GRACE_TIME', 3600))
+        self.submitted = Counter()
+        self.started = Counter()
+        self.running = Counter()
+        self.completed = Counter()
+        self.failed = Counter()
+        self.missed = Counter()
+        self.skipped = Counter()
+        self.last_duration = {}
+        self._lock = threading.Lock()
+
+    def executors(self):
+        return {self.EXECUTOR: ThreadPoolExecutor(self.workers)}
+
+    def job_defaults(self):
+        return {'coalesce': True, 'max_instances': self.max_instances, 'misfire_grace_time': self.misfire_grace_time}
+
+    def wrap(self, job_id, coroutine_function):
+        """
+        Wrap an async job so it runs to completion on a fresh event loop in the worker thread.
+        """
+        def run():
+            with self._lock:
+                self.started[job_id] += 1
+                self.running[job_id] += 1
+                self._export_queue_depth(job_id)
+            started = time.perf_counter()
+            try:
+                return asyncio.run(coroutine_function())
+            finally:
+                with self._lock:
+                    self.running[job_id] -= 1
+                    self.last_duration[job_id] = round(time.perf_counter() - started, 3)
+
+        return run
+
+    def add_job(self, scheduler, job_id, coroutine_function, trigger):
+        return scheduler.add_job(self.wrap(job_id, coroutine_function), trigger, id=job_id, name=job_id, executor=self.EXECUTOR, replace_existing=True)
+
+    def listen(self, scheduler):
+        scheduler.add_listener(self._on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+
+    def _on_event(self, event):
+        # APScheduler already logs errors, misses and skipped runs; only count them here
+        with self._lock:
+            if event.code == EVENT_JOB_SUBMITTED:
+                self.submitted[event.job_id] += 1
+                self._export_queue_depth(event.job_id)
+            elif event.code == EVENT_JOB_EXECUTED:
+                self.completed[event.job_id] += 1
+            elif event.code == EVENT_JOB_ERROR:
+                self.failed[event.job_id] += 1
+            elif event.code == EVENT_JOB_MISSED:
+                self.missed[event.job_id] += 1
+            elif event.code == EVENT_JOB_MAX_INSTANCES:
+                self.skipped[event.job_id] += 1
+
+    def _export_queue_depth(self, job_id):
+        # Called with the lock held, whenever a run is submitted or starts
+        REPORT_JOB_QUEUE_DEPTH.labels(job_id).set(max(0, self.submitted[job_id] - self.started[job_id]))
+
+    def queue_depth(self, job_id=None):
+        """
+        Runs handed to the executor that have not started yet.
+        """
+        with self._lock:
+            job_ids = [job_id] if job_id else set(self.submitted) | set(self.started)
+            # The submitted event can land just after the run starts, so clamp at zero
+            return sum(max(0, self.submitted[job] - self.started[job]) for job in job_ids)
+
+    def stats(self):
+        with self._lock:
+            job_ids = sorted(set(self.submitted) | set(self.started) | set(self.missed) | set(self.skipped))
+            jobs = {job_id: {
+                'queued': max(0, self.submitted[job_id] - self.started[job_id]),
+                'running': self.running[job_id],
+                'completed': self.completed[job_id],
+                'failed': self.failed[job_id],
+                'missed': self.missed[job_id],
+                'skipped': self.skipped[job_id],
+                'last_duration_s': self.last_duration.get(job_id)
+            } for job_id in job_ids}
+        return {'workers': self.workers, 'queue_depth': sum(job['queued'] for job in jobs.values()), 'jobs': jobs}
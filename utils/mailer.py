@@ -0,0 +1,264 @@
+from concurrent.futures import Future
+import asyncio
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from utils.metrics import SMTP_SEND_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+
+class SmtpConnectionPool:
+    """
+    Authenticated SMTP connections kept open between sends.
+
+    Opening a connection costs a TCP and TLS handshake plus a login, so
+    connections go back to the pool after each message and the next send
+    reuses them. Servers drop idle sessions, so a connection idle longer
+    than idle_timeout is closed rather than reused.
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None, size=None, timeout=None, idle_timeout=None):
+        self.host = host or os.getenv('SMTP_SERVER')
+        self.port = port or int(os.getenv('SMTP_PORT', 587))
+        self.username = username or os.getenv('SMTP_USERNAME')
+        self.password = password or os.getenv('SMTP_PASSWORD')
+        self.size = size or int(os.getenv('SMTP_POOL_SIZE', 2))
+        self.timeout = timeout or float(os.getenv('SMTP_TIMEOUT', 30))
+        self.idle_timeout = idle_timeout or float(os.getenv('SMTP_IDLE_TIMEOUT', 60))
+        self.connections_opened = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def acquire(self):
+        """
+        Return an idle connection that is still fresh, or open a new one.
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, released_at = self._idle.pop()
+            if time.monotonic() - released_at < self.idle_timeout:
+                return server
+            self._close(server)
+        return self._connect()
+
+    def release(self, server, broken=False):
+        """
+        Return a connection after a send; broken ones and any over the pool size are closed.
+        """
+        if not broken:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append((server, time.monotonic()))
+                    return
+        self._close(server)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+
+def _reset(server):
+    try:
+        return server.rset()[0] == 250
+    except Exception:
+        return False
+
+
+def _is_transient(error):
+    # 4xx replies and dropped connections are worth retrying; 5xx replies and bad credentials are not.
+    # SMTPException subclasses OSError, so every SMTP error must be settled before the socket-error fallback
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        # SMTPNotSupportedError and the like: the server will refuse again
+        return False
+    return isinstance(error, OSError)
+
+
+class Mailer:
+    """
+    Sends email from a background queue over pooled SMTP connections.
+
+    submit() returns at once with a Future, so building a report never waits
+    on the mail server. Worker threads (one per pooled connection) take
+    messages off the queue and send them back to back over their connection,
+    so a batch of reports or tenants shares one handshake and login.
+    Transient failures are retried with exponential backoff and full jitter;
+    each send's latency and size are logged and summarised by stats().
+    """
+
+    def __init__(self, pool=None, max_retries=None, backoff_factor=None, max_backoff=None):
+        self.pool = pool or SmtpConnectionPool()
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SMTP_MAX_RETRIES', 3))
+        self.backoff_factor = backoff_factor if backoff_factor is not None else float(os.getenv('SMTP_BACKOFF_FACTOR', 2))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.getenv('SMTP_MAX_BACKOFF', 60))
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.send_seconds = 0.0
+        self.max_send_seconds = 0.0
+        self._queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if not self._workers:
+                self._workers = [threading.Thread(target=self._work, name=f"mailer-{number}", daemon=True)
+                                 for number in range(self.pool.size)]
+                for worker in self._workers:
+                    worker.start()
+
+    def submit(self, message):
+        """
+        Queue an email.message.Message for delivery.
+
+        :return: Future resolving to the send latency in seconds, or to the
+            exception if the message could not be delivered
+        """
+        self._start()
+        future = Future()
+        self._queue.put((message, future))
+        return future
+
+    def send(self, message, timeout=None):
+        """
+        Queue a message and wait for it to be delivered.
+        """
+        return self.submit(message).result(timeout)
+
+    async def send_async(self, message):
+        return await asyncio.wrap_future(self.submit(message))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                message, future = item
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(self._deliver(message))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def _deliver(self, message):
+        content = message.as_bytes()
+        subject = message.get('Subject', '')
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            server = None
+            try:
+                server = self.pool.acquire()
+                server.send_message(message)
+            except Exception as e:
+                if server is not None:
+                    # A refused transaction leaves the session usable once reset; anything else drops the connection
+                    refused = isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused))
+                    self.pool.release(server, broken=not (refused and _reset(server)))
+                if not _is_transient(e) or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failed += 1
+                    logger.error(f"Failed to send '{subject}' ({len(content)} bytes): {e}")
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"Sending '{subject}' failed ({e}), retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.pool.release(server)
+            latency = time.perf_counter() - started
+            with self._lock:
+                self.sent += 1
+                self.bytes_sent += len(content)
+                self.send_seconds += latency
+                self.max_send_seconds = max(self.max_send_seconds, latency)
+            SMTP_SEND_SECONDS.observe(latency)
+            logger.info(f"Sent '{subject}' ({len(content)} bytes) in {latency:.2f}s")
+            return latency
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'retries': self.retries,
+                'queued': self._queue.qsize(),
+                'bytes_sent': self.bytes_sent,
+                'avg_send_seconds': round(self.send_seconds / self.sent, 3) if self.sent else None,
+                'max_send_seconds': round(self.max_send_seconds, 3),
+                'connections_opened': self.pool.connections_opened
+            }
+
+    def close(self, timeout=None):
+        """
+        Deliver everything already queued, then stop the workers and close the connections.
+        """
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join(timeout)
+        self.pool.close()
+
+
+_shared_mailer = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_mailer():
+    """
+    The process-wide mailer send_email uses.
+    """
+    global _shared_mailer
+    with _shared_lock:
+        if _shared_mailer is None:
+            _shared_mailer = Mailer()
+        return _shared_mailer
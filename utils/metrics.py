@@ -0,0 +1,147 @@
+from contextlib import contextmanager
+import logging
+import re
+import threading
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+logger = logging.getLogger(__name__)
+
+
+SHOPWARE_REQUEST_SECONDS = Histogram(
+    'shopware_request_duration_seconds', 'Latency of each ShopWare API request attempt, retries included',
+    ['endpoint', 'status'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+SHOPWARE_RESPONSE_BYTES = Histogram(
+    'shopware_response_bytes', 'Size of each ShopWare API response body after decompression',
+    ['endpoint'], buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+)
+SHOPWARE_REQUEST_PAGE = Histogram(
+    'shopware_request_page', 'Page number of each request to a paginated ShopWare endpoint',
+    ['endpoint'], buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+SHOPWARE_LOOKUPS = Counter(
+    'shopware_lookups', 'Inventory and staff IDs resolved, by whether the local index knew them (hit) or the API was asked (miss)',
+    ['kind', 'result']
+)
+SHOPWARE_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    'shopware_rate_limit_wait_seconds', 'Time each ShopWare request queued for a rate limiter token before it was sent',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+SHOPWARE_THROTTLED = Counter('shopware_throttled', 'ShopWare 429 responses that reached the rate limiter')
+RENDER_CACHE_LOOKUPS = Counter('render_cache_lookups', 'Render cache reads', ['result'])
+SMTP_SEND_SECONDS = Histogram(
+    'smtp_send_duration_seconds', 'Time to deliver each email over a pooled SMTP connection',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+REPORT_SECTION_SECONDS = Histogram(
+    'report_section_duration_seconds', 'Time spent in each section of a report run',
+    ['report', 'section'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+REPORT_JOB_QUEUE_DEPTH = Gauge(
+    'report_job_queue_depth', 'Scheduled report runs handed to the executor that have not started yet',
+    ['job_id']
+)
+
+# Inventory and staff IDs in paths would give every item its own series
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_label(path):
+    return ID_SEGMENT.sub('/{id}', path)
+
+
+def observe_request(path, status, seconds, size=None, page=None):
+    """
+    Record one ShopWare request attempt.
+
+    :param path: Path below the tenant, e.g. 'repair_orders' or 'inventories/123'
+    :param status: HTTP status code, or 'error' when no response came back
+    :param size: Response body size in bytes
+    :param page: Page number for paginated endpoints
+    """
+    endpoint = endpoint_label(path)
+    SHOPWARE_REQUEST_SECONDS.labels(endpoint, str(status)).observe(seconds)
+    if size is not None:
+        SHOPWARE_RESPONSE_BYTES.labels(endpoint).observe(size)
+    if page is not None:
+        SHOPWARE_REQUEST_PAGE.labels(endpoint).observe(int(page))
+
+
+def count_lookups(kind, hits=0, misses=0):
+    if hits:
+        SHOPWARE_LOOKUPS.labels(kind, 'hit').inc(hits)
+    if misses:
+        SHOPWARE_LOOKUPS.labels(kind, 'miss').inc(misses)
+
+
+def time_until_done(report, section, submit):
+    """
+    Record a report section that finishes in the background, e.g. an email
+    handed to the mailer: timed from the call to submit() until the Future it
+    returns is done, whether the work succeeded or failed.
+
+    :param submit: Callable starting the work and returning a concurrent.futures.Future
+    :return: The Future
+    """
+    started = time.perf_counter()
+    future = submit()
+    future.add_done_callback(lambda _: REPORT_SECTION_SECONDS.labels(report, section).observe(time.perf_counter() - started))
+    return future
+
+
+class SectionTimer:
+    """
+    Adds up the time a report run spends in each section (fetch, compute,
+    plot, render) and records one observation per section when the run ends.
+
+    Sections can nest: time inside an inner section counts only towards it,
+    so plotting done while rendering is not counted twice.
+    """
+
+    def __init__(self, report):
+        self.report = report
+        self.seconds = {}
+        self._stack = []
+        self._lock = threading.Lock()
+
+    def _charge(self, now):
+        if self._stack:
+            name, started = self._stack[-1]
+            self.seconds[name] = self.seconds.get(name, 0.0) + now - started
+            self._stack[-1] = (name, now)
+
+    @contextmanager
+    def section(self, name):
+        with self._lock:
+            now = time.perf_counter()
+            self._charge(now)
+            self._stack.append((name, now))
+        try:
+            yield
+        finally:
+            with self._lock:
+                now = time.perf_counter()
+                self._charge(now)
+                self._stack.pop()
+                if self._stack:
+                    self._stack[-1] = (self._stack[-1][0], now)
+
+    def observe(self):
+        """
+        Record the sections timed so far and start over.
+        """
+        with self._lock:
+            seconds, self.seconds = self.seconds, {}
+        for name, elapsed in seconds.items():
+            REPORT_SECTION_SECONDS.labels(self.report, name).observe(elapsed)
+        if seconds:
+            logger.info(f"{self.report.capitalize()} report sections: " + ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in seconds.items()))
+
+
+def latest():
+    """
+    Every metric in the Prometheus text format, with its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,105 @@
+from collections import Counter, OrderedDict
+import asyncio
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class OnDemandReports:
+    """
+    Serves reports requested over HTTP from a small in-memory cache.
+
+    A cached report younger than `ttl` seconds is returned as is. An older one
+    is kept if `version()` still returns the value it was built from (the
+    local store's high-water marks, when there is a store), so a report is
+    rebuilt only when the underlying data has changed. Concurrent requests
+    for the same key share one build (single-flight), and at most
+    `max_concurrent` builds or version checks run at a time across all keys,
+    so a burst of requests never turns into a burst of full ShopWare pulls.
+    """
+
+    def __init__(self, max_concurrent=None, ttl=None, max_entries=None):
+        self.max_concurrent = max_concurrent or int(os.getenv('REPORT_ENDPOINT_CONCURRENCY', 1))
+        self.ttl = ttl if ttl is not None else float(os.getenv('REPORT_CACHE_TTL', 300))
+        self.max_entries = max_entries or int(os.getenv('REPORT_CACHE_ENTRIES', 32))
+        self.counts = Counter()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._semaphore = None
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry['checked_at'] < self.ttl:
+            self._entries.move_to_end(key)
+            return entry
+        return None
+
+    def peek(self, key):
+        """
+        The cached report for `key` regardless of age, or None.
+        """
+        entry = self._entries.get(key)
+        return entry['value'] if entry is not None else None
+
+    async def get(self, key, build, version=None):
+        """
+        Return the report for `key`, building it at most once however many callers ask at the same time.
+
+        :param key: Hashable identifying the report, e.g. ('weekly', date, duration)
+        :param build: Coroutine function returning the rendered report, or None on failure. It is
+            called with the value version() just returned, None if there is none, so a build can
+            reuse whatever the version check already did
+        :param version: Optional coroutine function returning a value that changes when the data does
+        :return: The report, or None if it could not be built
+        """
+        entry = self._fresh(key)
+        if entry is not None:
+            self.counts['hits'] += 1
+            return entry['value']
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._resolve(key, build, version))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.counts['shared'] += 1
+        # A client that disconnects must not cancel the build the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _resolve(self, key, build, version):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with self._semaphore:
+            entry = self._entries.get(key)
+            current = await version() if version is not None else None
+            if entry is not None and current is not None and entry['version'] == current:
+                self.counts['revalidated'] += 1
+                entry['checked_at'] = time.monotonic()
+                self._entries.move_to_end(key)
+                return entry['value']
+            self.counts['builds'] += 1
+            started = time.perf_counter()
+            value = await build(current)
+            if value is None:
+                self.counts['failed'] += 1
+                return None
+            logger.info(f"Built on-demand report {key} in {time.perf_counter() - started:.2f}s")
+            self._entries[key] = {'value': value, 'version': current, 'checked_at': time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value
+
+    def stats(self):
+        return {
+            'cached': len(self._entries),
+            'in_flight': len(self._inflight),
+            'hits': self.counts['hits'],
+            'shared': self.counts['shared'],
+            'revalidated': self.counts['revalidated'],
+            'builds': self.counts['builds'],
+            'failed': self.counts['failed']
+        }
@@ -0,0 +1,90 @@
+"""
+Local stand-in for api.shop-ware.com that serves a recorded cassette.
+
+Record a cassette by running the reports once with SHOPWARE_CASSETTE_MODE=record,
+then start this server and point the client at it with
+SHOPWARE_BASE_URL=http://127.0.0.1:8080 to replay over real sockets:
+
+    python -m utils.standin_server --cassette data/shopware_cassette.json.gz --latency 0.08 --error-rate 0.02
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import gzip
+import json
+import logging
+import random
+import time
+from apps.cassette import Cassette, request_key
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_handler(cassette, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0):
+    """
+    Request handler class serving `cassette` with injected network behaviour.
+
+    :param latency: Seconds added to every response
+    :param jitter: Extra random delay of up to this many seconds
+    :param error_rate: Fraction of requests answered with a 503
+    :param throttle_rate: Fraction of requests answered with a 429 and Retry-After: 1
+    """
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency + random.uniform(0, jitter))
+            roll = random.random()
+            if roll < error_rate:
+                return self._send(503, {'error': 'injected failure'})
+            if roll < error_rate + throttle_rate:
+                return self._send(429, {'error': 'injected throttling'}, {'Retry-After': '1'})
+            interaction = cassette.lookup(self.path)
+            if interaction is None:
+                logger.warning(f"No recorded response for {request_key(self.path)}")
+                return self._send(404, {})
+            self._send(interaction['status'], interaction['body'])
+
+        def _send(self, status, body, headers=None):
+            content = (body if isinstance(body, str) else json.dumps(body)).encode('utf-8')
+            self.send_response(status)
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                content = gzip.compress(content)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return StandInHandler
+
+
+def serve(cassette_path=None, host='127.0.0.1', port=8080, **behaviour):
+    server = ThreadingHTTPServer((host, port), make_handler(Cassette(cassette_path), **behaviour))
+    logger.info(f"Serving ShopWare stand-in on http://{host}:{server.server_port}")
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cassette', default=None, help='Cassette file (default: SHOPWARE_CASSETTE_PATH)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay of up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with a 429')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = serve(args.cassette, args.host, args.port, latency=args.latency, jitter=args.jitter,
+                   error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -3,11 +3,11 @@ from dotenv import load_dotenv
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
-import smtplib
 import os
 import base64
-from bs4 import BeautifulSoup
 import uuid
+from apps.report import Report
+from utils.mailer import get_shared_mailer
 
 
 load_dotenv()
@@ -15,6 +15,8 @@ load_dotenv()
 
 
 def extract_images_from_html(html_content):
+    # Only HTML strings with data URIs come through here; Reports carry their images already
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html_content, 'html.parser')
     images = {}
     for img in soup.find_all('img'):
@@ -30,47 +32,54 @@ def extract_images_from_html(html_content):
 def create_email_with_images(message, html_content):
     # Extract images and update HTML
     updated_html, images = extract_images_from_html(html_content)
+    report = Report(updated_html, {img_id: (base64.b64decode(img_data), img_type) for img_id, (img_data, img_type) in images.items()})
+    return create_email_with_report(message, report)
 
+
+def create_email_with_report(message, report):
     # Attach HTML
-    html_part = MIMEText(updated_html, "html")
+    html_part = MIMEText(report.html, "html")
     message.attach(html_part)
 
     # Attach images
-    for img_id, (img_data, img_type) in images.items():
-        image = MIMEImage(base64.b64decode(img_data), _subtype=img_type)
+    for img_id, (img_data, img_type) in report.images.items():
+        image = MIMEImage(img_data, _subtype=img_type)
         image.add_header('Content-ID', f'<{img_id}>')
-        image.add_header('Content-Disposition', 'inline', filename=f'{img_id}.{img_type}')
+        # svg+xml -> .svg
+        image.add_header('Content-Disposition', 'inline', filename=f"{img_id}.{img_type.split('+')[0]}")
         message.attach(image)
 
     return message
 
 
-def send_email(subject, html_content, hasimage=False):
+def build_email(subject, html_content, hasimage=False, recipients=None):
     message = MIMEMultipart("alternative")
     message["Subject"] = f"{subject} - {date.today() - timedelta(days=1)}"
     message["From"] = f"{os.getenv('SENDER_NAME')} <{os.getenv('SENDER_EMAIL')}>"
     # Extract email addresses by splitting the string at semicolons
-    recipient_str = os.getenv('RECIPIENT_EMAIL')
+    recipient_str = recipients or os.getenv('RECIPIENT_EMAIL')
     recipients = recipient_str.split(';')  # Split the string by semicolons to get the list of emails
 
     # Join the email addresses into a single string separated by commas
     message["To"] = ", ".join([recipient.strip() for recipient in recipients])
 
     
-    # Create the HTML part of the message
-    if hasimage:
+    # Create the HTML part of the message; a Report already carries its images as bytes
+    if isinstance(html_content, Report):
+        message = create_email_with_report(message, html_content)
+    elif hasimage:
         message = create_email_with_images(message, html_content)
     else:
         html_part = MIMEText(html_content, "html")
         message.attach(html_part)
-    try:
-        # Establish the connection and send the email
-        with smtplib.SMTP(os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT'))) as server:
-            server.starttls()
-            server.login(os.getenv('SMTP_USERNAME'), os.getenv('SMTP_PASSWORD'))
-            server.send_message(message)
-        
-        print("Email sent successfully to all recipients")
-    
-    except Exception as e:
-        print(f"An error occurred while sending the email: {e}")
+    return message
+
+
+def send_email(subject, html_content, hasimage=False, recipients=None):
+    """
+    Queue a report email on the shared mailer and return without waiting for SMTP.
+
+    :param recipients: Semicolon-separated addresses, RECIPIENT_EMAIL by default
+    :return: Future resolving once the message is delivered; failures are logged by the mailer
+    """
+    return get_shared_mailer().submit(build_email(subject, html_content, hasimage, recipients))